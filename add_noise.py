@@ -1,33 +1,102 @@
-from pydub import AudioSegment
 import base64
 import io
-# Load main audio and background noise
-def add_noise(main_audio_path, noise_audio_path):
-    main_audio = AudioSegment.from_file(main_audio_path)
-    noise = AudioSegment.from_file(noise_audio_path)
-
-    # Loop or trim noise to match main audio length
-    if len(noise) < len(main_audio):
-        # Repeat noise if it's shorter
-        repeats = int(len(main_audio) / len(noise)) + 1
-        noise = noise * repeats
-    noise = noise[:len(main_audio)]
-
-    # Lower the volume of the noise (optional, e.g., -20 dB)
-    noise = noise - 20
-
-    # Overlay noise onto main audio
-    combined = main_audio.overlay(noise)
-    #convert to base64 str and return
-    
-    # Export to a bytes buffer
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+
+DEFAULT_SNR_DB = 20.0
+
+
+def _to_mono(audio):
+    return audio if audio.ndim == 1 else audio.mean(axis=1, dtype=np.float32)
+
+
+def _resample_linear(audio, orig_sr, target_sr):
+    """Cheap linear-interpolation resample, only used for the noise bed."""
+    if orig_sr == target_sr:
+        return audio
+    n_out = int(round(len(audio) * target_sr / orig_sr))
+    x_new = np.linspace(0, len(audio) - 1, n_out, dtype=np.float64)
+    return np.interp(x_new, np.arange(len(audio)), audio).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def load_noise(noise_audio_path, sr):
+    """Decode a noise bed once per (path, sample rate) and keep it in memory."""
+    noise, noise_sr = sf.read(str(noise_audio_path), dtype="float32", always_2d=True)
+    noise = _resample_linear(_to_mono(noise), noise_sr, sr)
+    noise.setflags(write=False)
+    return noise
+
+
+def _rms(x):
+    return float(np.sqrt(np.mean(np.square(x, dtype=np.float64)))) if x.size else 0.0
+
+
+def mix_noise(audio, noise, snr_db=DEFAULT_SNR_DB):
+    """
+    Mix a (mono) noise bed into `audio` at the requested SNR in dB.
+
+    `audio` is float32, shaped (frames,) or (frames, channels). The noise is
+    tiled over the clip by slicing views of the bed – no concatenation – and
+    the result is returned as a new float32 array of the same shape.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    out = audio.copy()
+    n = out.shape[0]
+    if n == 0 or noise.size == 0:
+        return out
+
+    noise_rms = _rms(noise)
+    if noise_rms == 0.0:
+        return out
+    gain = _rms(audio) / (noise_rms * 10 ** (snr_db / 20.0))
+
+    step = len(noise)
+    for start in range(0, n, step):
+        seg = noise[:min(step, n - start)]
+        if out.ndim == 1:
+            out[start:start + len(seg)] += gain * seg
+        else:
+            out[start:start + len(seg)] += gain * seg[:, None]
+
+    np.clip(out, -1.0, 1.0, out=out)
+    return out
+
+
+def to_pcm16(audio):
+    """Float [-1, 1] samples -> raw little-endian int16 PCM bytes."""
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def to_wav_base64(audio, sr):
+    """Encode float samples as a 16-bit WAV and return it as a base64 string."""
     buffer = io.BytesIO()
-    combined.export(buffer, format="wav")
-    buffer.seek(0)
+    sf.write(buffer, audio, sr, format="WAV", subtype="PCM_16")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
 
-    # Encode as base64 string
-    audio_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+def add_noise_array(main_audio_path, noise_audio_path, snr_db=DEFAULT_SNR_DB):
+    """Return (noised float32 samples, sample rate) for a clip."""
+    audio, sr = sf.read(str(main_audio_path), dtype="float32")
+    noise = load_noise(str(noise_audio_path), sr)
+    return mix_noise(audio, noise, snr_db), sr
+
+
+# Load main audio and background noise
+def add_noise(main_audio_path, noise_audio_path, snr_db=DEFAULT_SNR_DB, output="base64"):
+    """
+    Overlay the noise bed on a clip at `snr_db`.
 
-    return audio_base64
-    # Export the result
-    # combined.export("output_with_noise.wav", format="wav")
+    output="base64" (default, what the API scripts send), "array" for
+    (float32 samples, sr), or "pcm" for (int16 PCM bytes, sr).
+    """
+    noised, sr = add_noise_array(main_audio_path, noise_audio_path, snr_db)
+    if output == "array":
+        return noised, sr
+    if output == "pcm":
+        return to_pcm16(noised), sr
+    if output == "base64":
+        return to_wav_base64(noised, sr)
+    raise ValueError(f"unknown output format: {output!r}")
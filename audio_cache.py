@@ -0,0 +1,141 @@
+"""
+On-disk cache of decoded audio.
+
+Every WAV is decoded once to mono float32 at the requested sample rate
+(optionally truncated) and stored as `<cache_dir>/<key>.npy`. Later reads
+memory-map the array instead of decoding/resampling again.
+
+The key is sha256(file bytes) + sample rate + truncation length + decoder
+version, so neither a replaced file nor a changed decoder returns stale
+audio. When the directory grows past
+`max_bytes` the least recently used entries (by mtime, bumped on every
+hit) are evicted.
+
+    from audio_cache import load_audio
+    audio, sr = load_audio("Lines/04.wav", sr=16000, max_seconds=30)
+"""
+
+import hashlib
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = pathlib.Path(
+    os.environ.get("AUDIO_CACHE_DIR", pathlib.Path.home() / ".cache" / "audioprivacy" / "audio")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # 2 GiB
+
+_HASH_CHUNK = 1 << 20
+# bump whenever _decode's output changes; older entries then miss and age out
+DECODER_VERSION = "stream1"     # audio_stream.read_mono (was librosa.load)
+
+
+def file_hash(path) -> str:
+    """sha256 of the file contents, read in 1 MiB chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _decode(path, sr, max_seconds):
+    # streaming read: only the first `max_seconds` are decoded and resampled
+    from audio_stream import read_mono
+
+    return np.ascontiguousarray(read_mono(path, sr, max_seconds=max_seconds)), sr
+
+
+class AudioCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, digest, sr, max_seconds) -> pathlib.Path:
+        cap = "full" if max_seconds is None else f"{max_seconds:g}s"
+        return self.cache_dir / f"{digest}_{sr}_{cap}_{DECODER_VERSION}.npy"
+
+    def load(self, path, sr=None, max_seconds=None, digest=None):
+        """
+        Return (mono float32 array, sr) for `path`.
+
+        sr=None keeps the file's native rate. On a hit the array is a
+        read-only memory map.
+        """
+        if sr is None:
+            import soundfile as sf
+            sr = sf.info(str(path)).samplerate
+
+        digest = digest or file_hash(path)
+        entry = self._entry(digest, sr, max_seconds)
+        if entry.exists():
+            try:
+                audio = np.load(entry, mmap_mode="r")
+                os.utime(entry)
+                self.hits += 1
+                return audio, sr
+            except (OSError, ValueError):
+                entry.unlink(missing_ok=True)
+
+        self.misses += 1
+        audio, sr = _decode(path, sr, max_seconds)
+        self._store(entry, audio)
+        return audio, sr
+
+    def _store(self, entry: pathlib.Path, audio):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # write to a temp file then rename so readers never see a partial .npy
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, audio)
+            os.replace(tmp, entry)
+        except BaseException:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def size(self) -> int:
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*.npy"))
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        if not self.cache_dir.exists():
+            return
+        entries = []
+        for p in self.cache_dir.glob("*.npy"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for p in self.cache_dir.glob("*.npy"):
+            p.unlink(missing_ok=True)
+
+
+_default_cache = None
+
+
+def default_cache() -> AudioCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AudioCache()
+    return _default_cache
+
+
+def load_audio(path, sr=None, max_seconds=None):
+    """Decode `path` through the shared default cache."""
+    return default_cache().load(path, sr=sr, max_seconds=max_seconds)
@@ -0,0 +1,88 @@
+"""
+Streaming WAV reader.
+
+Decodes only the frames that are asked for, block by block, with mono
+downmix and resampling done on the fly (soxr streaming resampler), so
+peak memory depends on the block/window size and not on clip length.
+
+    from audio_stream import read_mono, iter_windows
+    audio = read_mono("Mixed_Durations/11.wav", 16000, max_seconds=30)
+    for start_s, window in iter_windows("Mixed_Durations/21.wav", 16000):
+        ...
+"""
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+BLOCK_SECONDS = 2.0
+
+
+def stream_blocks(path, target_sr, offset_seconds=0.0, max_seconds=None,
+                  block_seconds=BLOCK_SECONDS):
+    """Yield mono float32 blocks at `target_sr`, starting at `offset_seconds`."""
+    with sf.SoundFile(str(path)) as f:
+        src_sr = f.samplerate
+        start = min(int(offset_seconds * src_sr), f.frames)
+        f.seek(start)
+        remaining = f.frames - start
+        if max_seconds is not None:
+            remaining = min(remaining, int(max_seconds * src_sr))
+
+        resampler = (soxr.ResampleStream(src_sr, target_sr, 1, dtype="float32")
+                     if src_sr != target_sr else None)
+        block = max(1, int(block_seconds * src_sr))
+        while remaining > 0:
+            n = min(block, remaining)
+            data = f.read(n, dtype="float32", always_2d=True)
+            if not len(data):
+                break
+            remaining -= len(data)
+            mono = data.mean(axis=1, dtype=np.float32) if data.shape[1] > 1 else data[:, 0]
+            if resampler is None:
+                yield mono
+            else:
+                out = resampler.resample_chunk(mono, last=remaining <= 0)
+                if len(out):
+                    yield out
+        if resampler is not None and remaining > 0:
+            # file ended early (short read) – flush the resampler
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if len(tail):
+                yield tail
+
+
+def read_mono(path, target_sr, offset_seconds=0.0, max_seconds=None):
+    """Decode just [offset, offset + max_seconds) of `path` as mono float32."""
+    blocks = list(stream_blocks(path, target_sr, offset_seconds, max_seconds))
+    audio = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    if max_seconds is not None:
+        audio = audio[:int(max_seconds * target_sr)]
+    return audio
+
+
+def iter_windows(path, target_sr, window_seconds=30.0, hop_seconds=25.0):
+    """
+    Yield (start_seconds, window) over the whole clip: windows of
+    `window_seconds`, `window_seconds - hop_seconds` of overlap, the last
+    one possibly shorter. Only one window (plus a block) is held in memory.
+    Needs 0 < hop_seconds <= window_seconds: a zero hop never advances and a
+    hop longer than the window would skip audio.
+    """
+    win = int(window_seconds * target_sr)
+    hop = int(hop_seconds * target_sr)
+    if not 0 < hop <= win:
+        raise ValueError(f"need 0 < hop_seconds <= window_seconds, got hop {hop_seconds} s, "
+                         f"window {window_seconds} s at {target_sr} Hz")
+    buf = np.zeros(0, dtype=np.float32)
+    start = 0
+    emitted_to = 0          # sample index up to which audio was already covered
+    for block in stream_blocks(path, target_sr):
+        buf = np.concatenate([buf, block])
+        while len(buf) >= win:
+            yield start / target_sr, buf[:win].copy()
+            emitted_to = start + win
+            buf = buf[hop:]
+            start += hop
+    if len(buf) and start + len(buf) > emitted_to:
+        yield start / target_sr, buf
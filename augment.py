@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Precompute noised copies of the datasets.
+
+Mixes every WAV under audio_files/, Lines/ and Mixed_Durations/ with each
+noise source at each SNR in a process pool, and writes
+
+    noised/<noise>/snr_<S>dB/<dataset>/<relative path>.wav
+    noised/manifest.csv      source, noise, snr_db, output, sample_rate, frames
+
+Files that already exist and are newer than their source clip and noise
+are skipped, so re-running only fills gaps (and redoes edited clips). The
+evaluation scripts read these files via `ensure_noised` instead of mixing
+inline.
+
+USAGE
+    python augment.py                              # whitenoise.wav @ 20 dB
+    python augment.py --snr 0 10 20 --noise whitenoise.wav babble.wav --workers 8
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from add_noise import DEFAULT_SNR_DB
+from scheduler import duration
+
+ROOT          = pathlib.Path(__file__).resolve().parent
+DATASETS      = ["audio_files", "Lines", "Mixed_Durations"]
+DEFAULT_NOISE = ROOT / "whitenoise.wav"
+OUT_ROOT      = ROOT / "noised"
+MANIFEST      = "manifest.csv"
+FIELDS        = ["source", "noise", "snr_db", "output", "sample_rate", "frames"]
+
+
+def _rel(path: pathlib.Path) -> pathlib.Path:
+    path = pathlib.Path(path).resolve()
+    try:
+        return path.relative_to(ROOT)
+    except ValueError:
+        # clips outside the repo: keyed by their folder, so same-named clips
+        # of different actors don't share one noised file
+        folder = hashlib.sha1(str(path.parent).encode()).hexdigest()[:12]
+        return pathlib.Path("external") / f"{path.parent.name}-{folder}" / path.name
+
+
+def _display(path: pathlib.Path) -> str:
+    path = path.resolve()
+    return path.relative_to(ROOT).as_posix() if path.is_relative_to(ROOT) else str(path)
+
+
+def noised_path(src, noise=DEFAULT_NOISE, snr_db=DEFAULT_SNR_DB, out_root=OUT_ROOT) -> pathlib.Path:
+    """Where the noised copy of `src` for (noise, snr_db) lives."""
+    return pathlib.Path(out_root) / pathlib.Path(noise).stem / f"snr_{snr_db:g}dB" / _rel(src)
+
+
+def _is_fresh(out: pathlib.Path, *sources) -> bool:
+    """True if `out` exists and was written after every source was last modified."""
+    try:
+        mtime = out.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return all(mtime >= pathlib.Path(src).stat().st_mtime for src in sources)
+
+
+def _mix_one(src: str, noise: str, snr_db: float, out: str):
+    """Worker: mix one clip and write it atomically. Returns a manifest row."""
+    import soundfile as sf
+    from add_noise import add_noise_array
+
+    audio, sr = add_noise_array(src, noise, snr_db)
+    out_p = pathlib.Path(out)
+    out_p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_p.with_name(out_p.name + f".{os.getpid()}.tmp")
+    sf.write(str(tmp), audio, sr, format="WAV", subtype="PCM_16")
+    os.replace(tmp, out_p)
+    return {"source": _rel(src).as_posix(), "noise": pathlib.Path(noise).name,
+            "snr_db": snr_db, "output": _display(out_p), "sample_rate": sr, "frames": len(audio)}
+
+
+def ensure_noised(src, noise=DEFAULT_NOISE, snr_db=DEFAULT_SNR_DB, out_root=OUT_ROOT) -> pathlib.Path:
+    """Path of the precomputed noised clip, mixing it now if the sweep hasn't."""
+    out = noised_path(src, noise, snr_db, out_root)
+    if not _is_fresh(out, src, noise):
+        _mix_one(str(src), str(noise), snr_db, str(out))
+    return out
+
+
+def _read_manifest(path: pathlib.Path):
+    if not path.exists():
+        return {}
+    with open(path, newline="", encoding="utf-8") as fh:
+        return {row["output"]: row for row in csv.DictReader(fh)}
+
+
+def sweep(snrs, noises, datasets=DATASETS, out_root=OUT_ROOT, workers=None):
+    """Mix every (clip, noise, snr) that isn't on disk yet; returns the manifest rows."""
+    out_root = pathlib.Path(out_root)
+    manifest_path = out_root / MANIFEST
+    rows = _read_manifest(manifest_path)
+
+    clips = sorted(p for d in datasets if (ROOT / d).exists() for p in (ROOT / d).rglob("*.wav"))
+    jobs = []
+    for noise in noises:
+        for snr in snrs:
+            for clip in clips:
+                out = noised_path(clip, noise, snr, out_root)
+                if not _is_fresh(out, clip, noise):
+                    jobs.append((str(clip), str(noise), snr, str(out)))
+    # longest clips first so no worker is left with a long one at the end
+    jobs.sort(key=lambda job: duration(job[0]), reverse=True)
+    print(f"🔊 {len(clips)} clips × {len(noises)} noises × {len(snrs)} SNRs → "
+          f"{len(jobs)} to mix")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_mix_one, *job): job for job in jobs}
+        for i, fut in enumerate(as_completed(futures), 1):
+            try:
+                row = fut.result()
+            except Exception as e:
+                print(f"❌ {futures[fut][0]}: {e}")
+                continue
+            rows[row["output"]] = row
+            if i % 50 == 0 or i == len(jobs):
+                print(f"   {i}/{len(jobs)}")
+
+    out_root.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=FIELDS)
+        w.writeheader()
+        w.writerows(sorted(rows.values(), key=lambda r: r["output"]))
+    return list(rows.values())
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Precompute noised copies of the datasets.")
+    p.add_argument("--snr", type=float, nargs="+", default=[DEFAULT_SNR_DB],
+                   help=f"SNR levels in dB (default: {DEFAULT_SNR_DB:g})")
+    p.add_argument("--noise", type=pathlib.Path, nargs="+", default=[DEFAULT_NOISE],
+                   help="noise source WAVs (default: whitenoise.wav)")
+    p.add_argument("--datasets", nargs="+", default=DATASETS)
+    p.add_argument("--out_root", type=pathlib.Path, default=OUT_ROOT)
+    p.add_argument("--workers", type=int, default=None,
+                   help="processes (default: one per core)")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = sweep(args.snr, args.noise, args.datasets, args.out_root, args.workers)
+    print(f"📝 {len(rows)} noised clips listed in {args.out_root / MANIFEST}")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark the audio evaluation pipeline stage by stage on the bundled WAVs.
+
+Stages (each timed per clip):
+  decode      soundfile read at native rate
+  resample    mono downmix + soxr resample to 16 kHz
+  add_noise   NumPy noise mix (add_noise.mix_noise)
+  base64      WAV encode + base64 (what the API scripts send)
+  features    Whisper-style log-mel extraction (Qwen2-Audio's front end)
+  generate    greedy decode with a tiny randomly initialised GPT-2 (no download)
+
+Reports clips/s, audio-seconds/s, p50/p95 latency and peak RSS per stage
+as JSON, so runs can be compared across commits on a CPU-only machine.
+Audio-seconds count what a stage processes: whole clips for decode, the
+first MAX_SECONDS of each clip from resample on.
+
+USAGE
+    python bench.py                         # all bundled WAVs
+    python bench.py --limit 10 --repeat 3 --output bench.json
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from add_noise import load_noise, mix_noise, to_wav_base64
+
+ROOT        = pathlib.Path(__file__).resolve().parent
+CLIP_DIRS   = [ROOT / "audio_files", ROOT / "Lines", ROOT / "Mixed_Durations"]
+NOISE_PATH  = ROOT / "whitenoise.wav"
+TARGET_SR   = 16000
+MAX_SECONDS = 30          # same cap as qwen_test_Ata.analyse_clip
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, KiB on Linux
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(xs, q) -> float:
+    return float(np.percentile(xs, q)) if xs else 0.0
+
+
+def summarise(latencies, audio_seconds):
+    total = sum(latencies)
+    return {
+        "clips": len(latencies),
+        "total_s": round(total, 4),
+        "clips_per_s": round(len(latencies) / total, 2) if total else None,
+        "audio_s_per_s": round(audio_seconds / total, 2) if total else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def time_stage(fn, inputs, repeat):
+    """Run fn over every input `repeat` times; return (outputs of last pass, latencies)."""
+    latencies, outputs = [], []
+    for _ in range(repeat):
+        outputs = []
+        for x in inputs:
+            t0 = time.perf_counter()
+            outputs.append(fn(x))
+            latencies.append(time.perf_counter() - t0)
+    return outputs, latencies
+
+
+def _feature_extractor():
+    from transformers import WhisperFeatureExtractor
+    # Qwen2-Audio uses a 128-bin Whisper front end at 16 kHz
+    return WhisperFeatureExtractor(feature_size=128, sampling_rate=TARGET_SR)
+
+
+def _stub_model():
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(0)
+    cfg = GPT2Config(vocab_size=1024, n_positions=512, n_embd=64, n_layer=2, n_head=2)
+    return GPT2LMHeadModel(cfg).eval()
+
+
+def run(clips, repeat=1, new_tokens=32):
+    results = {}
+
+    decoded, lat = time_stage(lambda p: sf.read(str(p), dtype="float32"), clips, repeat)
+    audio_s = sum(len(a) / sr for a, sr in decoded) * repeat
+    results["decode"] = summarise(lat, audio_s)
+    # every later stage only sees the first MAX_SECONDS of each clip
+    capped_s = sum(min(len(a) / sr, MAX_SECONDS) for a, sr in decoded) * repeat
+
+    def resample(item):
+        audio, sr = item
+        mono = audio.mean(axis=1, dtype=np.float32) if audio.ndim > 1 else audio
+        return soxr.resample(mono[:MAX_SECONDS * sr], sr, TARGET_SR)
+
+    mono16k, lat = time_stage(resample, decoded, repeat)
+    results["resample"] = summarise(lat, capped_s)
+
+    noise = load_noise(str(NOISE_PATH), TARGET_SR)
+    noised, lat = time_stage(lambda a: mix_noise(a, noise), mono16k, repeat)
+    results["add_noise"] = summarise(lat, capped_s)
+
+    _, lat = time_stage(lambda a: to_wav_base64(a, TARGET_SR), noised, repeat)
+    results["base64"] = summarise(lat, capped_s)
+
+    try:
+        fe = _feature_extractor()
+    except ImportError as e:
+        results["features"] = {"skipped": str(e)}
+    else:
+        _, lat = time_stage(
+            lambda a: fe(a, sampling_rate=TARGET_SR, return_tensors="np"), noised, repeat)
+        results["features"] = summarise(lat, capped_s)
+
+    try:
+        import torch
+        model = _stub_model()
+    except ImportError as e:
+        results["generate"] = {"skipped": str(e)}
+    else:
+        prompt = torch.randint(0, model.config.vocab_size, (1, 64))
+
+        def generate(_):
+            with torch.no_grad():
+                return model.generate(prompt, max_new_tokens=new_tokens, do_sample=False,
+                                      pad_token_id=0)
+
+        _, lat = time_stage(generate, noised, repeat)
+        results["generate"] = summarise(lat, capped_s)
+        results["generate"]["tokens_per_s"] = round(
+            new_tokens * len(lat) / sum(lat), 1) if sum(lat) else None
+
+    return results
+
+
+def find_clips(limit=None):
+    clips = sorted(p for d in CLIP_DIRS if d.exists() for p in d.rglob("*.wav"))
+    return clips[:limit] if limit else clips
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Time each stage of the audio pipeline.")
+    p.add_argument("--limit", type=int, default=None, help="only the first N clips")
+    p.add_argument("--repeat", type=int, default=1, help="passes over the clips per stage")
+    p.add_argument("--new_tokens", type=int, default=32, help="tokens per stub generate")
+    p.add_argument("--output", type=pathlib.Path, default=None,
+                   help="write the JSON report here as well as to stdout")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    clips = find_clips(args.limit)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "clips": len(clips),
+        "repeat": args.repeat,
+        "stages": run(clips, args.repeat, args.new_tokens),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Append-only manifest of scraped clips (SQLite).
+
+Replaces rescanning data.csv and Lines/ for every new id: ids come from an
+AUTOINCREMENT column, so handing one out is a single indexed insert, and
+the clip's metadata and WAV path are recorded in the same transaction.
+If the database file is missing it is rebuilt from data.csv and the WAVs
+already in Lines/.
+"""
+
+import csv
+import os
+import pathlib
+import sqlite3
+import threading
+
+MANIFEST_PATH = "clips.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    actor    TEXT,
+    movie    TEXT,
+    line     TEXT,
+    duration REAL,
+    wav_path TEXT
+)
+"""
+
+
+def _csv_rows(csv_path: pathlib.Path):
+    """Yield well-formed data.csv rows, skipping anything unparsable."""
+    if not csv_path.exists():
+        return
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            try:
+                idx = int((row.get("id") or "").strip())
+            except ValueError:
+                continue
+            try:
+                dur = float(row.get("Duration") or 0)
+            except ValueError:
+                dur = 0.0
+            yield idx, row.get("Actor Name"), row.get("Movie Name"), row.get("Line"), dur
+
+
+def clip_count(path=MANIFEST_PATH):
+    """Rows in an existing manifest, opened read-only; None if there is none yet."""
+    path = pathlib.Path(path)
+    if not path.exists():
+        return None
+    # immutable=1 writes no -wal/-shm files; only safe when no -wal is pending
+    wal = os.path.exists(f"{path}-wal")
+    conn = sqlite3.connect(f"file:{path.resolve()}?{'mode=ro' if wal else 'immutable=1'}", uri=True)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class ClipManifest:
+    def __init__(self, path=MANIFEST_PATH, csv_path="data.csv", wav_dir="Lines"):
+        self.path = pathlib.Path(path)
+        self.wav_dir = pathlib.Path(wav_dir)
+        fresh = not self.path.exists()
+        # one connection shared by the scraper threads, serialised by a lock;
+        # other processes are kept apart by SQLite's own file locking
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        if fresh:
+            self.rebuild(pathlib.Path(csv_path))
+
+    def wav_path(self, idx: int) -> pathlib.Path:
+        return self.wav_dir / f"{idx:02d}.wav"
+
+    def rebuild(self, csv_path: pathlib.Path):
+        """Re-create the table from data.csv plus any Lines/NN.wav it lacks."""
+        rows = {idx: (idx, actor, movie, line, dur, str(self.wav_path(idx)))
+                for idx, actor, movie, line, dur in _csv_rows(csv_path)}
+        if self.wav_dir.exists():
+            for p in self.wav_dir.glob("*.wav"):
+                try:
+                    idx = int(p.stem)
+                except ValueError:
+                    continue
+                rows.setdefault(idx, (idx, None, None, None, None, str(p)))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM clips")
+                self._conn.executemany(
+                    "INSERT INTO clips (id, actor, movie, line, duration, wav_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", sorted(rows.values()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add(self, actor, movie, line, duration) -> int:
+        """Allocate the next id and record the clip under it; returns the id."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "INSERT INTO clips (actor, movie, line, duration) VALUES (?, ?, ?, ?)",
+                    (actor, movie, line, duration))
+                idx = cur.lastrowid
+                self._conn.execute("UPDATE clips SET wav_path = ? WHERE id = ?",
+                                   (str(self.wav_path(idx)), idx))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return idx
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
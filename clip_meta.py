@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+clip.cafe page → (actor, movie, line, duration).
+
+`extract_meta` is called once per scraped clip, inside the driver loop, so
+it avoids building a pure-Python tree of the whole page:
+
+  • <script>/<style> blocks (most of an ad-heavy page) are cut out with one
+    precompiled regex before parsing;
+  • the tree is built by selectolax or lxml when either is installed, with
+    BeautifulSoup(html.parser) as the fallback;
+  • only the nodes the metadata lives in are looked up
+    (div.movieCastActor, div.highlight-box, a.white.pl-10, the actor link).
+
+All three parsers return the same tuple; `python clip_meta.py` checks that on
+the fixture pages and times each available backend.
+
+USAGE
+    python clip_meta.py                          # fixtures/clipcafe/*.html
+    python clip_meta.py page1.html page2.html --repeat 500
+"""
+
+import argparse
+import pathlib
+import re
+import statistics
+import time
+
+ROOT         = pathlib.Path(__file__).resolve().parent
+FIXTURES_DIR = ROOT / "fixtures" / "clipcafe"
+
+_DURATION_RE = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*secs?", re.I)
+_NOISE_RE    = re.compile(r"<(script|style)\b.*?</\1\s*>", re.I | re.S)
+_LABEL_RE    = r"^{}\s*:\s*"
+
+
+def _strings(parts, sep) -> str:
+    """Same joining as bs4's get_text(sep, strip=True)."""
+    return sep.join(s for s in (p.strip() for p in parts) if s)
+
+
+def _line(char, quote_txt) -> str:
+    if not char:
+        return quote_txt
+    return re.sub(_LABEL_RE.format(re.escape(char)), "", quote_txt, flags=re.I)
+
+
+def _duration(html) -> float:
+    m = _DURATION_RE.search(html)
+    return float(m.group(1)) if m else 0.0
+
+
+# ─── parser backends ───────────────────────────────────────────
+# each takes the stripped page and returns (actor, char, movie, quote_txt)
+
+def _selectolax(page):
+    from selectolax.parser import HTMLParser
+
+    def text(node, sep=""):
+        return _strings(node.text(deep=True, separator="\x00").split("\x00"), sep)
+
+    tree = HTMLParser(page)
+    cast = tree.css_first("div.movieCastActor")
+    link = cast.css_first("a[href*='actor/']") if cast else None
+    if link:
+        char, actor = text(cast.css_first("b")), text(link)
+    else:
+        a_tag = tree.css_first("a[href*='actor/']")
+        actor = text(a_tag) if a_tag else "Unknown"
+        char_tag = tree.css_first("div.highlight-box b")
+        char = text(char_tag) if char_tag else ""
+    movie = text(tree.css_first("a.white.pl-10"))
+    quote = text(tree.css_first("div.highlight-box"), " ")
+    return actor, char, movie, quote
+
+
+def _has_class(*names):
+    return " and ".join(
+        f"contains(concat(' ', normalize-space(@class), ' '), ' {n} ')" for n in names)
+
+
+_X_CAST  = f"//div[{_has_class('movieCastActor')}]"
+_X_ACTOR = ".//a[contains(@href, 'actor/')]"
+_X_QUOTE = f"//div[{_has_class('highlight-box')}]"
+_X_MOVIE = f"//a[{_has_class('white', 'pl-10')}]"
+
+
+def _lxml(page):
+    import lxml.html
+
+    def first(node, xpath):
+        found = node.xpath(xpath)
+        return found[0] if found else None
+
+    def text(node, sep=""):
+        return _strings(node.itertext(), sep)
+
+    tree = lxml.html.fromstring(page)
+    cast = first(tree, _X_CAST)
+    link = first(cast, _X_ACTOR) if cast is not None else None
+    if link is not None:
+        char, actor = text(first(cast, ".//b")), text(link)
+    else:
+        a_tag = first(tree, _X_ACTOR)
+        actor = text(a_tag) if a_tag is not None else "Unknown"
+        char_tag = first(tree, _X_QUOTE + "//b")
+        char = text(char_tag) if char_tag is not None else ""
+    movie = text(first(tree, _X_MOVIE))
+    quote = text(first(tree, _X_QUOTE), " ")
+    return actor, char, movie, quote
+
+
+def _bs4(page):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, "html.parser")
+    cast = soup.select_one("div.movieCastActor")
+    link = cast.select_one("a[href*='actor/']") if cast else None
+    if link:
+        char, actor = cast.select_one("b").get_text(strip=True), link.get_text(strip=True)
+    else:
+        a_tag = soup.select_one("a[href*='actor/']")
+        actor = a_tag.get_text(strip=True) if a_tag else "Unknown"
+        char_tag = soup.select_one("div.highlight-box b")
+        char = char_tag.get_text(strip=True) if char_tag else ""
+    movie = soup.select_one("a.white.pl-10").get_text(strip=True)
+    quote = soup.select_one("div.highlight-box").get_text(" ", strip=True)
+    return actor, char, movie, quote
+
+
+BACKENDS = {"selectolax": _selectolax, "lxml": _lxml, "bs4": _bs4}
+_MODULES = {"selectolax": "selectolax.parser", "lxml": "lxml.html", "bs4": "bs4"}
+
+
+def available_backends() -> list:
+    import importlib.util
+    out = []
+    for name, module in _MODULES.items():
+        try:
+            if importlib.util.find_spec(module) is not None:
+                out.append(name)
+        except ModuleNotFoundError:
+            pass
+    return out
+
+
+_default = None
+
+
+def default_backend() -> str:
+    global _default
+    if _default is None:
+        found = available_backends()
+        if not found:
+            raise ModuleNotFoundError("install selectolax, lxml or beautifulsoup4")
+        _default = found[0]
+    return _default
+
+
+def extract_meta(html: str, backend=None):
+    """
+    Return (actor, movie, cleaned_line, duration), handling pages that
+    lack the grey “Character by Actor” bar or any actor link at all.
+    """
+    parse = BACKENDS[backend or default_backend()]
+    actor, char, movie, quote_txt = parse(_NOISE_RE.sub("", html))
+    return actor, movie, _line(char, quote_txt), _duration(html)
+
+
+# ─── microbenchmark ────────────────────────────────────────────
+def bench(pages, repeat):
+    """
+    Per-backend ms per page; raises if any backend disagrees with bs4 (or,
+    without bs4 installed, with the default backend).
+    """
+    results = {}
+    names = available_backends()
+    reference = "bs4" if "bs4" in names else default_backend()
+    expected = [extract_meta(html, reference) for html in pages]
+    for name in names:
+        metas = [extract_meta(html, name) for html in pages]
+        if metas != expected:
+            raise AssertionError(f"{name} disagrees with {reference}: {metas} != {expected}")
+        raw = BACKENDS[name]
+        timings = {}
+        for label, fn in (("full page", lambda h: raw(h)),
+                          ("extract_meta", lambda h: extract_meta(h, name))):
+            per_page = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                for html in pages:
+                    fn(html)
+                per_page.append((time.perf_counter() - t0) / len(pages) * 1000)
+            timings[label] = statistics.median(per_page)
+        results[name] = timings
+    return results
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Check and time extract_meta parser backends.")
+    p.add_argument("pages", nargs="*", type=pathlib.Path)
+    p.add_argument("--repeat", type=int, default=100)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = args.pages or sorted(FIXTURES_DIR.glob("*.html"))
+    pages = [p.read_text(encoding="utf-8") for p in paths]
+    for path, html in zip(paths, pages):
+        print(f"{path.name}: {extract_meta(html)}")
+    results = bench(pages, args.repeat)
+    base = results.get("bs4", {}).get("full page")
+    print(f"\n{'backend':<12}{'full page ms':>14}{'extract_meta ms':>17}{'speedup':>10}")
+    for name, t in results.items():
+        speedup = f"{base / t['extract_meta']:.1f}×" if base else "-"
+        print(f"{name:<12}{t['full page']:>14.3f}{t['extract_meta']:>17.3f}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
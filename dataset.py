@@ -0,0 +1,226 @@
+"""
+Unified clip dataset.
+
+Ingests the three places clips live today
+
+  • data.csv            → Lines/NN.wav            (int ids)
+  • mixedDuration.csv   → Mixed_Durations/NN.wav  (zero-padded string ids)
+  • audio_files/<actor>/*.wav                     (actor from the folder name)
+
+into one Parquet table (`dataset.parquet`) and answers queries from
+in-memory indexes on actor, movie and duration bucket, so selecting a
+subset never walks directories.
+
+USAGE
+    python dataset.py build
+    python dataset.py query --actor "Brad Pitt" --max_duration 10
+
+    from dataset import ClipDataset
+    ds = ClipDataset.load()
+    ds.query(actor="christian bale", max_duration=5)
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import pathlib
+import re
+from collections import defaultdict
+
+from scheduler import duration
+
+ROOT          = pathlib.Path(__file__).resolve().parent
+STORE_PATH    = ROOT / "dataset.parquet"
+SOURCES = {
+    # source name: (metadata csv, wav folder)
+    "lines": (ROOT / "data.csv", ROOT / "Lines"),
+    "mixed": (ROOT / "mixedDuration.csv", ROOT / "Mixed_Durations"),
+}
+ACTOR_DIR     = ROOT / "audio_files"
+BUCKET_EDGES  = [0, 5, 10, 20, 30, 60]    # seconds; last bucket is open-ended
+
+
+def schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("source", pa.string()),
+        ("clip_id", pa.string()),
+        ("actor", pa.string()),
+        ("actor_key", pa.string()),
+        ("movie", pa.string()),
+        ("line", pa.string()),
+        ("duration", pa.float64()),
+        ("duration_bucket", pa.int16()),
+        ("wav_path", pa.string()),
+        ("has_audio", pa.bool_()),
+    ])
+
+
+def actor_key(name) -> str:
+    """'Robert Pattinson', 'robertpattinson' and 'robert_pattinson' → 'robertpattinson'."""
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+
+def duration_bucket(seconds):
+    """Bucket index for `seconds`; None when the duration is unknown."""
+    if seconds is None:
+        return None
+    return max(0, bisect.bisect_right(BUCKET_EDGES, seconds) - 1)
+
+
+def _rel(path: pathlib.Path) -> str:
+    return path.relative_to(ROOT).as_posix()
+
+
+def _csv_records(source, csv_path: pathlib.Path, wav_dir: pathlib.Path):
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            raw_id = (row.get("id") or "").strip()
+            if not raw_id.isdigit():
+                continue
+            # data.csv writes 1, 2, …; mixedDuration.csv 01, 02, …; files are NN.wav
+            wav = wav_dir / f"{int(raw_id):02d}.wav"
+            # WAV header first (the CSV column is off by up to 10 s), then the
+            # CSV; None if neither gives a length, so no bucket claims the row
+            yield dict(source=source, clip_id=raw_id, actor=row.get("Actor Name"),
+                       movie=row.get("Movie Name"), line=row.get("Line"),
+                       duration=duration(wav) or None, wav=wav)
+
+
+def _actor_dir_records(actor_dir: pathlib.Path):
+    for wav in sorted(actor_dir.glob("*/*.wav")):
+        yield dict(source="audio_files", clip_id=wav.stem, actor=wav.parent.name,
+                   movie=None, line=None, duration=duration(wav) or None, wav=wav)
+
+
+def records():
+    """Every labelled clip from the CSVs and actor folders (`wav` is a Path, may be missing)."""
+    for source, (csv_path, wav_dir) in SOURCES.items():
+        if csv_path.exists():
+            yield from _csv_records(source, csv_path, wav_dir)
+    if ACTOR_DIR.exists():
+        yield from _actor_dir_records(ACTOR_DIR)
+
+
+def build(store_path=STORE_PATH):
+    """Scan the CSVs and folders once and write the Parquet store."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cols = defaultdict(list)
+    for r in records():
+        cols["source"].append(r["source"])
+        cols["clip_id"].append(r["clip_id"])
+        cols["actor"].append(r["actor"])
+        cols["actor_key"].append(actor_key(r["actor"]))
+        cols["movie"].append(r["movie"])
+        cols["line"].append(r["line"])
+        cols["duration"].append(r["duration"])
+        cols["duration_bucket"].append(duration_bucket(r["duration"]))
+        cols["wav_path"].append(_rel(r["wav"]))
+        cols["has_audio"].append(r["wav"].exists())
+
+    table_schema = schema()
+    table = pa.table({name: cols[name] for name in table_schema.names}, schema=table_schema)
+    pq.write_table(table, store_path)
+    return table
+
+
+class ClipDataset:
+    def __init__(self, table):
+        self.table = table
+        self._rows = table.to_pylist()
+        self.by_actor = defaultdict(list)
+        self.by_movie = defaultdict(list)
+        self.by_bucket = defaultdict(list)
+        for i, r in enumerate(self._rows):
+            self.by_actor[r["actor_key"]].append(i)
+            self.by_movie[(r["movie"] or "").lower()].append(i)
+            self.by_bucket[r["duration_bucket"]].append(i)
+
+    @classmethod
+    def load(cls, store_path=STORE_PATH, rebuild=False):
+        store_path = pathlib.Path(store_path)
+        if rebuild or not store_path.exists():
+            return cls(build(store_path))
+        import pyarrow.parquet as pq
+
+        return cls(pq.read_table(store_path))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def query(self, actor=None, movie=None, min_duration=None, max_duration=None,
+              source=None, with_audio=True):
+        """Rows (dicts incl. wav_path) matching every given filter."""
+        candidates = None
+
+        def narrow(ids):
+            nonlocal candidates
+            ids = set(ids)
+            candidates = ids if candidates is None else candidates & ids
+
+        if actor is not None:
+            narrow(self.by_actor.get(actor_key(actor), ()))
+        if movie is not None:
+            narrow(self.by_movie.get(movie.lower(), ()))
+        if min_duration is not None or max_duration is not None:
+            lo = duration_bucket(min_duration or 0)
+            hi = duration_bucket(max_duration) if max_duration is not None else len(BUCKET_EDGES) - 1
+            narrow(i for b in range(lo, hi + 1) for i in self.by_bucket.get(b, ()))
+
+        ids = sorted(candidates) if candidates is not None else range(len(self._rows))
+        out = []
+        for i in ids:
+            r = self._rows[i]
+            if r["duration"] is None and (min_duration is not None or max_duration is not None):
+                continue
+            if min_duration is not None and r["duration"] < min_duration:
+                continue
+            if max_duration is not None and r["duration"] > max_duration:
+                continue
+            if source is not None and r["source"] != source:
+                continue
+            if with_audio and not r["has_audio"]:
+                continue
+            out.append(r)
+        return out
+
+    def wav_paths(self, **filters):
+        return [ROOT / r["wav_path"] for r in self.query(**filters)]
+
+
+# ─────────────── CLI ─────────────── #
+def parse_args():
+    p = argparse.ArgumentParser(description="Build / query the unified clip dataset.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help=f"(re)write {STORE_PATH.name}")
+    q = sub.add_parser("query", help="print matching clips as JSON lines")
+    q.add_argument("--actor")
+    q.add_argument("--movie")
+    q.add_argument("--source", choices=[*SOURCES, "audio_files"])
+    q.add_argument("--min_duration", type=float)
+    q.add_argument("--max_duration", type=float)
+    q.add_argument("--include_missing", action="store_true",
+                   help="also list CSV rows whose WAV is not on disk")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.cmd == "build":
+        table = build()
+        print(f"Wrote {table.num_rows} clips to {STORE_PATH}")
+        return
+
+    ds = ClipDataset.load()
+    for r in ds.query(actor=args.actor, movie=args.movie, source=args.source,
+                      min_duration=args.min_duration, max_duration=args.max_duration,
+                      with_audio=not args.include_missing):
+        print(json.dumps(r, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
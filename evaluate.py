@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Multi-model evaluation orchestrator.
+
+Enumerates the clips once, decodes (and optionally noises) each clip once,
+and fans the same array out to several model backends running
+concurrently:
+
+  • API backends (openai, qwen-server) – a thread pool per backend
+  • local backends (qwen, kimi)       – one dedicated worker thread that
+                                        owns the model and batches clips
+
+Every answer goes through the shared result cache and is appended to
+<output>.jsonl as it arrives. The joined table (one row per clip, one
+column per backend) is written to <output> as CSV at the end.
+
+USAGE
+    python evaluate.py --backends openai qwen --dirs Lines Mixed_Durations --snr 20
+    python evaluate.py --backends qwen-server --server http://127.0.0.1:8765
+"""
+
+import argparse
+import base64
+import csv
+import pathlib
+import queue
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from add_noise import load_noise, mix_noise, to_wav_base64
+from audio_cache import default_cache, file_hash
+from result_cache import ResultCache
+from result_sink import ResultSink
+from scheduler import duration
+import telemetry
+from telemetry import span
+
+ROOT           = pathlib.Path(__file__).resolve().parent
+DEFAULT_DIRS   = ["audio_files", "Lines", "Mixed_Durations"]
+DEFAULT_OUTPUT = ROOT / "eval_results.csv"
+DEFAULT_PROMPT = "Can you figure out who this speaker is?"
+NOISE_PATH     = ROOT / "whitenoise.wav"
+TARGET_SR      = 16000     # every backend gets 16 kHz mono
+MAX_SECONDS    = 30
+
+
+class Clip:
+    __slots__ = ("rel", "path", "audio_hash", "audio", "sr")
+
+    def __init__(self, rel, path, audio_hash, audio, sr):
+        self.rel, self.path, self.audio_hash, self.audio, self.sr = rel, path, audio_hash, audio, sr
+
+
+# ─── backends ──────────────────────────────────────────────────
+class Backend:
+    """`kind` is "api" (thread pool) or "local" (single worker, batched)."""
+    name = ""
+    kind = "api"
+    model = ""
+    params: dict = {}
+
+    def configure(self):
+        """Settle `model` / `params` (the cache key) without loading anything."""
+
+    def start(self):
+        pass
+
+    def analyse(self, clips, prompt):
+        """Return one answer per clip."""
+        raise NotImplementedError
+
+
+class OpenAIBackend(Backend):
+    name, kind = "openai", "api"
+
+    def __init__(self, base_url=None):
+        from openai_test import MODEL, REQUEST_PARAMS
+        self.base_url = base_url
+        self.model = MODEL
+        # the audio sent differs from openai_test's (native-rate, uncapped), so
+        # the preprocessing is part of the key and neither serves the other's answers
+        self.params = dict(REQUEST_PARAMS, sr=TARGET_SR, max_seconds=MAX_SECONDS)
+
+    def start(self):
+        from openai import OpenAI
+        self.client = OpenAI(base_url=self.base_url)
+
+    def analyse(self, clips, prompt):
+        from openai_test import build_request
+        out = []
+        for clip in clips:
+            req = build_request(to_wav_base64(clip.audio, clip.sr), prompt)
+            resp = self.client.chat.completions.create(**req)
+            out.append(resp.choices[0].message.audio.transcript)
+        return out
+
+
+class QwenServerBackend(Backend):
+    name, kind = "qwen-server", "api"
+
+    def __init__(self, server, model_name):
+        from qwen_test_Ata import GEN_KWARGS
+        self.server = server
+        self.model = model_name
+        self.gen_kwargs = dict(GEN_KWARGS)
+        self.params = dict(GEN_KWARGS, precision=None)
+
+    def configure(self):
+        from qwen_server import check_server
+        # answers are cached under what the server actually runs, not the local flags
+        info = check_server(self.server, self.model)
+        self.model = info["model"]
+        self.gen_kwargs = dict(info.get("gen_kwargs") or self.gen_kwargs)
+        self.params = dict(self.gen_kwargs, precision=info.get("precision"))
+
+    def start(self):
+        self.configure()
+
+    def analyse(self, clips, prompt):
+        from add_noise import to_pcm16
+        from qwen_server import analyse_remote
+        return [analyse_remote(self.server, {
+            "pcm16_b64": base64.b64encode(to_pcm16(c.audio)).decode("ascii"),
+            "sample_rate": c.sr, "prompt": prompt, "gen_kwargs": self.gen_kwargs})
+            for c in clips]
+
+
+class QwenBackend(Backend):
+    name, kind = "qwen", "local"
+
+    def __init__(self, model_name, precision=None):
+        from qwen_test_Ata import GEN_KWARGS
+        self.model = model_name
+        self.precision = precision
+        self.params = dict(GEN_KWARGS, precision=precision)
+
+    def start(self):
+        from qwen_test_Ata import load_model
+        self.processor, self.qwen = load_model(self.model, self.precision)
+
+    def analyse(self, clips, prompt):
+        from qwen_test_Ata import _build_prompt, generate_answers
+        audios = [c.audio for c in clips]
+        prompts = [_build_prompt(self.processor, a, prompt) for a in audios]
+        return generate_answers(audios, self.processor, self.qwen, prompts)
+
+
+class KimiBackend(Backend):
+    name, kind = "kimi", "local"
+    model = "moonshotai/Kimi-Audio-7B-Instruct"
+    params = {"text_temperature": 0.0, "text_top_k": 5}
+
+    def start(self):
+        from kimi_runner import KimiRunner
+        # caches audio/text tokens by content hash across clips and runs
+        self.kimi = KimiRunner(model_path=self.model, load_detokenizer=False)
+
+    def analyse(self, clips, prompt):
+        import soundfile as sf
+        out = []
+        for clip in clips:
+            # KimiAudio only takes file paths
+            with tempfile.NamedTemporaryFile(suffix=".wav") as tmp:
+                sf.write(tmp.name, clip.audio, clip.sr)
+                messages = [
+                    {"role": "user", "message_type": "text", "content": prompt},
+                    {"role": "user", "message_type": "audio", "content": tmp.name},
+                ]
+                _, text, _ = self.kimi.generate(messages, "text", **self.params)
+            out.append(text)
+        return out
+
+
+# ─── runners ───────────────────────────────────────────────────
+class LocalWorker:
+    """Dedicated thread owning a local model; batches up to `batch_size` clips."""
+
+    def __init__(self, backend, prompt, batch_size):
+        self.backend, self.prompt, self.batch_size = backend, prompt, batch_size
+        self._q: "queue.Queue[tuple[Clip, Future] | None]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, clip) -> Future:
+        fut: Future = Future()
+        self._q.put((clip, fut))
+        return fut
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+
+    def _loop(self):
+        try:
+            self.backend.start()
+        except Exception as exc:
+            self._drain(exc)
+            return
+        done = False
+        while not done:
+            item = self._q.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    done = True
+                    break
+                batch.append(nxt)
+            try:
+                with span(self.backend.name, batch=len(batch)):
+                    answers = self.backend.analyse([c for c, _ in batch], self.prompt)
+                for (_, fut), answer in zip(batch, answers):
+                    fut.set_result(answer)
+            except Exception as exc:
+                for _, fut in batch:
+                    fut.set_exception(exc)
+
+    def _drain(self, exc):
+        while (item := self._q.get()) is not None:
+            item[1].set_exception(exc)
+
+
+class ApiWorker:
+    def __init__(self, backend, prompt, concurrency):
+        self.backend, self.prompt = backend, prompt
+        backend.start()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    def submit(self, clip) -> Future:
+        def call():
+            with span(self.backend.name):
+                return self.backend.analyse([clip], self.prompt)[0]
+        return self._pool.submit(call)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+# ─── orchestration ─────────────────────────────────────────────
+def _clip_paths(dirs):
+    return [p for d in dirs for p in sorted((ROOT / d).rglob("*.wav"))]
+
+
+def _noise_config(snr_db):
+    return {"noise": NOISE_PATH.name, "snr_db": snr_db} if snr_db is not None else None
+
+
+def iter_clips(dirs, snr_db=None, skip=()):
+    """Decode (through the audio cache) and optionally noise each clip exactly once."""
+    noise = load_noise(str(NOISE_PATH), TARGET_SR) if snr_db is not None else None
+    paths = [p for p in _clip_paths(dirs) if p not in skip]
+    # shortest first: local batches then hold clips of similar length
+    for path in sorted(paths, key=lambda p: min(duration(p), MAX_SECONDS)):
+        with span("decode", path=path.name):
+            digest = file_hash(path)
+            audio, sr = default_cache().load(path, TARGET_SR, MAX_SECONDS, digest=digest)
+        if noise is not None:
+            with span("noise"):
+                audio = mix_noise(audio, noise, snr_db)
+        yield Clip(path.relative_to(ROOT).as_posix(), path, digest, audio, sr)
+
+
+def find_duplicates(dirs, readonly=False) -> dict:
+    """{duplicate path: canonical path} from the acoustic fingerprint index."""
+    from fingerprint import FingerprintIndex
+    with span("dedupe"):
+        dupes = FingerprintIndex(readonly=readonly).duplicates(_clip_paths(dirs))
+    print(f"🔁 {len(dupes)} duplicate clip(s) reuse another clip's answers")
+    return dupes
+
+
+def evaluate(backends, dirs, prompt, out_path, snr_db=None, batch_size=4, concurrency=4,
+             dedupe=False):
+    out_path = pathlib.Path(out_path)
+    noise_cfg = _noise_config(snr_db)
+    dupes = find_duplicates(dirs) if dedupe else {}
+    cache = ResultCache()
+    workers = {b.name: (LocalWorker(b, prompt, batch_size) if b.kind == "local"
+                        else ApiWorker(b, prompt, concurrency)) for b in backends}
+    table: dict = {}
+    sink = ResultSink(out_path.with_suffix(".jsonl"))
+    lock = threading.Lock()
+
+    def done(backend, clip, key, meta, fut):
+        try:
+            answer = fut.result()
+            cache.put(key, answer, **meta)
+        except Exception as exc:
+            answer = f"ERROR: {exc}"
+        with lock:
+            table[clip.rel][backend.name] = answer
+            sink.write(f"{backend.name}/{clip.rel}", answer)
+        print(f"✅ [{backend.name}] {clip.rel}: {answer[:80]}")
+
+    try:
+        for clip in iter_clips(dirs, snr_db, skip=dupes):
+            table[clip.rel] = {}
+            for b in backends:
+                key, meta = cache.entry(clip.audio_hash, prompt, b.model, b.params, noise_cfg)
+                cached = cache.get(key)
+                if cached is not None:
+                    with lock:
+                        table[clip.rel][b.name] = cached
+                    continue
+                fut = workers[b.name].submit(clip)
+                fut.add_done_callback(lambda f, b=b, c=clip, k=key, m=meta: done(b, c, k, m, f))
+        for w in workers.values():
+            w.close()
+        # duplicates (same audio, possibly noised/re-encoded) take their canonical's answers
+        for dup, canon in dupes.items():
+            rel, canon_rel = dup.relative_to(ROOT).as_posix(), canon.relative_to(ROOT).as_posix()
+            table[rel] = dict(table.get(canon_rel, {}))
+            for name, answer in table[rel].items():
+                sink.write(f"{name}/{rel}", answer, duplicate_of=canon_rel)
+    finally:
+        sink.close()
+
+    names = [b.name for b in backends]
+    with open(out_path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["clip", *names])
+        for rel, answers in table.items():
+            w.writerow([rel, *(answers.get(n, "") for n in names)])
+    return table
+
+
+def plan(backends, dirs, prompt, snr_db=None, dedupe=False) -> dict:
+    """Clips per backend that are not in the result cache yet; decodes and loads nothing."""
+    noise_cfg = _noise_config(snr_db)
+    for b in backends:
+        try:
+            b.configure()
+        except OSError as exc:
+            print(f"⚠️ {b.name}: {exc}; planning with the local settings")
+    dupes = find_duplicates(dirs, readonly=True) if dedupe else {}
+    cache = ResultCache(readonly=True)
+    paths = [p for p in _clip_paths(dirs) if p not in dupes]
+    todo = {b.name: [] for b in backends}
+    for path in paths:
+        digest = file_hash(path)
+        for b in backends:
+            if cache.get(cache.key(digest, prompt, b.model, b.params, noise_cfg)) is None:
+                todo[b.name].append(path.relative_to(ROOT).as_posix())
+    audio_s = sum(min(duration(p), MAX_SECONDS) for p in paths)
+    print(f"{len(paths)} clips ({audio_s:.0f} audio-seconds) in {', '.join(dirs)}")
+    for name, rels in todo.items():
+        print(f"  {name}: {len(paths) - len(rels)} cached, {len(rels)} to run")
+    return todo
+
+
+# ─── CLI ───────────────────────────────────────────────────────
+BACKENDS = ["openai", "qwen", "qwen-server", "kimi"]
+
+
+def make_backends(args):
+    out = []
+    for name in args.backends:
+        if name == "openai":
+            out.append(OpenAIBackend(args.base_url))
+        elif name == "qwen":
+            out.append(QwenBackend(args.model_name, args.precision))
+        elif name == "qwen-server":
+            if not args.server:
+                raise SystemExit("qwen-server backend needs --server")
+            out.append(QwenServerBackend(args.server, args.model_name))
+        elif name == "kimi":
+            out.append(KimiBackend())
+    return out
+
+
+def parse_args():
+    from qwen_test_Ata import PRECISIONS
+
+    p = argparse.ArgumentParser(description="Evaluate several models over one decoded pass.")
+    p.add_argument("--backends", nargs="+", choices=BACKENDS, required=True)
+    p.add_argument("--dirs", nargs="+", default=DEFAULT_DIRS)
+    p.add_argument("--prompt", default=DEFAULT_PROMPT)
+    p.add_argument("--snr", type=float, default=None,
+                   help="mix whitenoise.wav at this SNR (default: clean audio)")
+    p.add_argument("--output", type=pathlib.Path, default=DEFAULT_OUTPUT)
+    p.add_argument("--batch_size", type=int, default=4, help="clips per local-model batch")
+    p.add_argument("--concurrency", type=int, default=4, help="in-flight requests per API backend")
+    p.add_argument("--model_name", default="Qwen/Qwen2-Audio-7B-Instruct")
+    p.add_argument("--precision", choices=PRECISIONS, default=None,
+                   help="see qwen_test_Ata --precision")
+    p.add_argument("--server", default=None, help="qwen_server.py URL")
+    p.add_argument("--base_url", default=None, help="OpenAI-compatible base URL")
+    p.add_argument("--trace", type=pathlib.Path, default=None,
+                   help="write a Chrome trace + per-stage summary here")
+    p.add_argument("--dry_run", action="store_true",
+                   help="only count the uncached (clip, backend) pairs")
+    p.add_argument("--dedupe", action="store_true",
+                   help="run each acoustically duplicate clip once (see fingerprint.py)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.dry_run:
+        plan(make_backends(args), args.dirs, args.prompt, args.snr, args.dedupe)
+        return
+    if args.trace:
+        telemetry.enable(args.trace)
+    table = evaluate(make_backends(args), args.dirs, args.prompt, args.output,
+                     args.snr, args.batch_size, args.concurrency, args.dedupe)
+    print(f"📝 {len(table)} clips × {len(args.backends)} backends → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
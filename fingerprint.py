@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Acoustic fingerprints for finding duplicate clips.
+
+Each clip is reduced to spectral-peak pairs ("constellation" hashes): the
+strongest local maxima of its log spectrogram are paired with the next few
+peaks that follow them, and every pair becomes a 24-bit hash
+
+    f1 (9 bits) | f2 (9 bits) | Δt (6 bits)      at anchor time t1
+
+Peaks survive re-encoding and additive noise (e.g. add_noise at 20 dB) far
+better than raw samples do, so noised copies and re-downloads still match.
+A copy that starts a fraction of a hop earlier or later lands its peaks in
+different frames and loses most of its hashes, so queries are
+fingerprinted at SUB_HOPS shifts within one hop and the best-aligned
+shift counts.
+Hashes go into an inverted index (SQLite on disk; a hash-sorted NumPy
+array in memory), so a query only touches the postings of its own hashes.
+It never scans every clip. A match is a clip that shares many hashes at one
+consistent time offset.
+
+USAGE
+    python fingerprint.py build                        # audio_files, Lines, Mixed_Durations
+    python fingerprint.py dupes                        # print duplicate groups
+    python fingerprint.py match some.wav
+
+    idx = FingerprintIndex()
+    idx.duplicates(paths)       # {duplicate path: canonical path}
+
+With readonly=True (for --dry_run planning) the on-disk index is copied
+into memory and new clips are fingerprinted there; the file is never
+created or changed.
+"""
+
+import argparse
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audio_cache import file_hash, load_audio
+from result_cache import readonly_uri
+
+ROOT        = pathlib.Path(__file__).resolve().parent
+DATASETS    = ["audio_files", "Lines", "Mixed_Durations"]
+INDEX_PATH  = ROOT / "fingerprints.sqlite"
+
+SR          = 8000        # fingerprints only need the speech band
+N_FFT       = 512         # 64 ms window → 257 bins of 15.6 Hz
+HOP         = 256         # 32 ms frames
+PEAK_F      = 10          # local-max neighbourhood, bins either side
+PEAK_T      = 10          # … and frames either side
+PEAKS_PER_S = 30          # strongest peaks kept per second
+FAN_OUT     = 8           # pairs per anchor peak
+MAX_DT      = 63          # frames (6 bits)
+MAX_DF      = 128         # bins between paired peaks
+MIN_MATCHES = 12          # aligned hashes needed for a match
+MIN_RATIO   = 0.15        # aligned hashes / hashes of the shorter clip
+SUB_HOPS    = 4           # query shifts per hop (HOP / SUB_HOPS = 8 ms apart)
+
+Match = namedtuple("Match", "path score ratio offset_s")
+
+_WINDOW = np.hanning(N_FFT).astype(np.float32)
+_OFFSET_SPAN = 1 << 24    # packs (clip, time offset) into one int64
+
+
+# ─── fingerprinting ────────────────────────────────────────────
+def spectrogram(audio) -> np.ndarray:
+    """Log-magnitude STFT, shape (bins, frames)."""
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < N_FFT:
+        audio = np.pad(audio, (0, N_FFT - len(audio)))
+    frames = sliding_window_view(audio, N_FFT)[::HOP]
+    return np.log(np.abs(np.fft.rfft(frames * _WINDOW, axis=1)) + 1e-6).T
+
+
+def _max_filter(x, radius, axis):
+    pad = [(0, 0)] * x.ndim
+    pad[axis] = (radius, radius)
+    padded = np.pad(x, pad, constant_values=-np.inf)
+    return sliding_window_view(padded, 2 * radius + 1, axis=axis).max(axis=-1)
+
+
+def peaks(spec):
+    """(freq bins, frames) of the strongest local maxima, sorted by time."""
+    # separable 2-D maximum filter: over frequency, then over time
+    local_max = _max_filter(_max_filter(spec, PEAK_F, 0), PEAK_T, 1)
+    f, t = np.nonzero((spec == local_max) & (spec > np.median(spec) + 1.0))
+    keep = int(PEAKS_PER_S * spec.shape[1] * HOP / SR) + 1
+    if len(f) > keep:
+        strongest = np.argpartition(-spec[f, t], keep)[:keep]
+        f, t = f[strongest], t[strongest]
+    order = np.lexsort((f, t))
+    return f[order], t[order]
+
+
+def hashes(f, t):
+    """(hash, anchor frame) arrays from time-sorted peaks."""
+    out_h, out_t = [], []
+    for k in range(1, FAN_OUT + 1):
+        f1, t1, f2, t2 = f[:-k], t[:-k], f[k:], t[k:]
+        dt = t2 - t1
+        ok = (dt > 0) & (dt <= MAX_DT) & (np.abs(f2 - f1) <= MAX_DF)
+        out_h.append((f1[ok].astype(np.int64) << 15) | (f2[ok].astype(np.int64) << 6) | dt[ok])
+        out_t.append(t1[ok])
+    if not out_h:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(out_h), np.concatenate(out_t).astype(np.int64)
+
+
+def fingerprint(audio):
+    """(hashes, anchor frames) for a mono array at SR."""
+    return hashes(*peaks(spectrogram(audio)))
+
+
+def fingerprint_shifts(audio):
+    """[(hashes, anchor frames, shift in samples)] for SUB_HOPS shifts of the query."""
+    audio = np.asarray(audio, dtype=np.float32)
+    step = HOP // SUB_HOPS
+    return [(*fingerprint(audio[shift:]), shift) for shift in range(0, HOP, step)]
+
+
+def fingerprint_file(path):
+    audio, _ = load_audio(path, sr=SR)
+    h, t = fingerprint(audio)
+    return h, t, len(audio) / SR
+
+
+def _rel(path) -> str:
+    path = pathlib.Path(path).resolve()
+    try:
+        return path.relative_to(ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+# ─── inverted index ────────────────────────────────────────────
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    id       INTEGER PRIMARY KEY,
+    path     TEXT UNIQUE,
+    sha256   TEXT,
+    seconds  REAL,
+    n_hashes INTEGER
+);
+CREATE TABLE IF NOT EXISTS hashes (hash INTEGER, clip INTEGER, t INTEGER);
+CREATE INDEX IF NOT EXISTS hashes_clip ON hashes(clip);
+"""
+
+
+class FingerprintIndex:
+    def __init__(self, path=INDEX_PATH, readonly=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if readonly:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            if os.path.exists(path):
+                disk = sqlite3.connect(readonly_uri(path), uri=True)
+                disk.backup(self._conn)
+                disk.close()
+        else:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+        self._arrays = None     # (hash, clip, t) sorted by hash, built on first query
+        self._clips = None      # id → (path, n_hashes, sha256)
+
+    def add(self, path) -> int:
+        """Fingerprint `path` unless it is already indexed with the same bytes; return its id."""
+        rel, digest = _rel(path), file_hash(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, sha256 FROM clips WHERE path = ?", (rel,)).fetchone()
+        if row and row[1] == digest:
+            return row[0]
+        h, t, seconds = fingerprint_file(path)
+        with self._lock, self._conn:
+            if row:
+                self._conn.execute("DELETE FROM hashes WHERE clip = ?", (row[0],))
+                self._conn.execute("DELETE FROM clips WHERE id = ?", (row[0],))
+            cur = self._conn.execute(
+                "INSERT INTO clips (path, sha256, seconds, n_hashes) VALUES (?, ?, ?, ?)",
+                (rel, digest, seconds, len(h)))
+            clip_id = cur.lastrowid
+            self._conn.executemany("INSERT INTO hashes VALUES (?, ?, ?)",
+                                   zip(h.tolist(), [clip_id] * len(h), t.tolist()))
+        self._arrays = self._clips = None
+        return clip_id
+
+    def build(self, paths):
+        t0 = time.perf_counter()
+        for i, path in enumerate(paths, 1):
+            self.add(path)
+            if i % 100 == 0:
+                print(f"   {i}/{len(paths)} fingerprinted")
+        print(f"🔖 {len(paths)} clips indexed in {time.perf_counter() - t0:.1f}s")
+
+    def _load(self):
+        if self._arrays is None:
+            with self._lock:
+                rows = self._conn.execute("SELECT hash, clip, t FROM hashes").fetchall()
+                clips = self._conn.execute(
+                    "SELECT id, path, n_hashes, sha256 FROM clips").fetchall()
+            data = np.array(rows, dtype=np.int64).reshape(-1, 3)
+            data = data[np.argsort(data[:, 0], kind="stable")]
+            self._arrays = data[:, 0].copy(), data[:, 1].copy(), data[:, 2].copy()
+            self._clips = {cid: (p, n, sha) for cid, p, n, sha in clips}
+        return self._arrays
+
+    def match(self, path=None, audio=None, min_matches=MIN_MATCHES, min_ratio=MIN_RATIO):
+        """Indexed clips that contain the query at a consistent offset, best first."""
+        if audio is None:
+            audio, _ = load_audio(path, sr=SR)
+        best = {}
+        # every sub-hop shift of the query; a clip keeps its best-aligned one
+        for qh, qt, shift in fingerprint_shifts(audio):
+            for m in self._query(qh, qt, min_matches, min_ratio):
+                if m.path not in best or m.score > best[m.path].score:
+                    best[m.path] = m._replace(offset_s=round(m.offset_s - shift / SR, 4))
+        return sorted(best.values(), key=lambda m: -m.score)
+
+    def _query(self, qh, qt, min_matches=MIN_MATCHES, min_ratio=MIN_RATIO):
+        H, C, T = self._load()
+        if not len(qh) or not len(H):
+            return []
+
+        # postings of every query hash via binary search on the sorted hash column
+        lo, hi = np.searchsorted(H, qh, "left"), np.searchsorted(H, qh, "right")
+        n = hi - lo
+        total = int(n.sum())
+        if not total:
+            return []
+        q = np.repeat(np.arange(len(qh)), n)
+        pos = np.arange(total) - np.repeat(np.cumsum(n) - n, n) + np.repeat(lo, n)
+        offsets = T[pos] - qt[q]
+
+        # votes per (clip, offset); a clip's score is its best-aligned offset
+        keys, votes = np.unique(C[pos] * _OFFSET_SPAN + offsets + _OFFSET_SPAN // 2,
+                                return_counts=True)
+        order = np.argsort(-votes, kind="stable")
+        keys, votes = keys[order], votes[order]
+        clips = keys // _OFFSET_SPAN
+        _, first = np.unique(clips, return_index=True)
+
+        out = []
+        for i in first:
+            clip_id, score = int(clips[i]), int(votes[i])
+            clip_path, n_hashes, _ = self._clips[clip_id]
+            ratio = score / max(1, min(len(qh), n_hashes))
+            if score >= min_matches and ratio >= min_ratio:
+                offset = int(keys[i] % _OFFSET_SPAN) - _OFFSET_SPAN // 2
+                out.append(Match(clip_path, score, round(ratio, 3), offset * HOP / SR))
+        return sorted(out, key=lambda m: -m.score)
+
+    def duplicates(self, paths) -> dict:
+        """
+        {duplicate: canonical} over `paths` (indexing them first). The
+        canonical copy is the earliest in `paths`; identical bytes match
+        without a lookup.
+        """
+        for path in paths:
+            self.add(path)
+        self._load()
+        sha_of = {p: sha for p, _, sha in self._clips.values()}
+        by_rel = {_rel(p): p for p in paths}
+        by_sha = {}
+        canon = {}
+        for rel in by_rel:
+            if rel in canon:
+                continue
+            if sha_of[rel] in by_sha:
+                canon[rel] = by_sha[sha_of[rel]]
+                continue
+            by_sha[sha_of[rel]] = rel
+            for m in self.match(by_rel[rel]):
+                if m.path != rel and m.path in by_rel and m.path not in canon:
+                    canon[m.path] = rel
+        return {by_rel[d]: by_rel[c] for d, c in canon.items()}
+
+    def close(self):
+        self._conn.close()
+
+
+# ─── CLI ───────────────────────────────────────────────────────
+def _paths(dirs):
+    return [p for d in dirs for p in sorted((ROOT / d).rglob("*.wav"))]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Spectral-peak fingerprints and duplicate search.")
+    p.add_argument("command", choices=["build", "dupes", "match"])
+    p.add_argument("files", nargs="*", type=pathlib.Path, help="query WAVs for `match`")
+    p.add_argument("--dirs", nargs="+", default=DATASETS)
+    p.add_argument("--index", type=pathlib.Path, default=INDEX_PATH)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    idx = FingerprintIndex(args.index)
+    if args.command == "build":
+        idx.build(_paths(args.dirs))
+    elif args.command == "dupes":
+        dupes = idx.duplicates(_paths(args.dirs))
+        groups = {}
+        for dup, canon in dupes.items():
+            groups.setdefault(canon, []).append(dup)
+        for canon, dups in groups.items():
+            print(f"{_rel(canon)}  ⇐  {', '.join(_rel(d) for d in dups)}")
+        print(f"🔁 {len(dupes)} duplicate clip(s) in {len(groups)} group(s)")
+    else:
+        for f in args.files:
+            t0 = time.perf_counter()
+            matches = idx.match(f)
+            print(f"{f}  ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+            for m in matches[:5]:
+                print(f"   {m.path}  score {m.score}  ratio {m.ratio}  offset {m.offset_s:+.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Plain-HTTP clip download for script.py (`--http`).
+
+Reuses the Selenium cookies in clipcafe_cookies.pkl with one pooled
+`requests` session. The clip page is fetched once, the metadata is read
+from it (clip_meta.extract_meta), and the WAV endpoint is resolved from
+the download form that holds `input#audio-wav` (or a direct .wav link).
+The file is streamed into a `.part` file next to Lines/NN.wav and renamed
+into place by the caller, hashing it on the way.
+
+Anything that needs a real browser raises `NeedsBrowser` (login redirect,
+403, no download form in the served HTML, an HTML answer where audio was
+expected), and script.py retries those clips through the Selenium flow.
+
+Running this file starts a mock clip.cafe that serves fixtures/clipcafe:
+
+    python http_download.py --port 8766
+    python script.py --base_url http://127.0.0.1:8766 https://clip.cafe/cast_bar/
+
+  GET  /<name>/     fixtures/clipcafe/<name>.html
+  GET|POST /download/   a short silent WAV when format=wav
+  --require_cookie NAME answers 302 → /login/ / 403 without that cookie
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import pathlib
+import pickle
+import tempfile
+import wave
+from collections import namedtuple
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urljoin, urlsplit, urlunsplit
+
+from clip_meta import FIXTURES_DIR, extract_meta
+from telemetry import count, span
+
+COOKIES_FILE = "clipcafe_cookies.pkl"
+USER_AGENT   = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/126.0 Safari/537.36")
+TIMEOUT      = 30
+CHUNK        = 1 << 16
+
+Download = namedtuple("Download", "path size sha256")
+
+
+class NeedsBrowser(RuntimeError):
+    """This clip can't be fetched over plain HTTP; use the Selenium flow."""
+
+
+# ─── endpoint resolution ───────────────────────────────────────
+class _DownloadForms(HTMLParser):
+    """Collects <form>s (fields, and whether they hold input#audio-wav) and .wav links."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms, self.links = [], []
+        self._form = None
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: v or "" for k, v in attrs}
+        if tag == "form":
+            self._form = {"action": a.get("action", ""), "method": a.get("method", "get").lower(),
+                          "fields": {}, "forced": set(), "wav": False}
+            self.forms.append(self._form)
+        elif tag == "a" and urlsplit(a.get("href", "")).path.lower().endswith(".wav"):
+            self.links.append(a["href"])
+        elif tag in ("input", "button") and self._form is not None and a.get("name"):
+            self._field(tag, a)
+
+    def _field(self, tag, a):
+        form, name = self._form, a["name"]
+        kind = a.get("type", "submit" if tag == "button" else "text").lower()
+        if a.get("id") == "audio-wav":
+            form["wav"] = True
+            form["fields"][name] = a.get("value", "on")
+            form["forced"].add(name)
+        elif kind in ("radio", "checkbox"):
+            if "checked" in a and name not in form["forced"]:
+                form["fields"][name] = a.get("value", "on")
+        elif kind == "submit":
+            form["fields"].setdefault(name, a.get("value", ""))
+        elif kind not in ("button", "reset", "file", "image"):
+            form["fields"][name] = a.get("value", "")
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+
+
+def resolve_wav(html: str, page_url: str):
+    """(method, url, fields) of the WAV download for a clip page, or NeedsBrowser."""
+    parser = _DownloadForms()
+    parser.feed(html)
+    for form in parser.forms:
+        if form["wav"]:
+            method = "post" if form["method"] == "post" else "get"
+            return method, urljoin(page_url, form["action"] or page_url), form["fields"]
+    if parser.links:
+        return "get", urljoin(page_url, parser.links[0]), {}
+    raise NeedsBrowser("no WAV download form in the page HTML")
+
+
+# ─── session ───────────────────────────────────────────────────
+class ClipSession:
+    """
+    Pooled, cookie-carrying HTTP session. `base_url` sends every clip URL
+    to another host instead (e.g. the mock server below); cookies then
+    lose their domain so they are sent there too.
+    """
+
+    def __init__(self, cookies_file=COOKIES_FILE, base_url=None, pool_size=8, timeout=TIMEOUT):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        self._load_cookies(cookies_file)
+
+    def _load_cookies(self, cookies_file):
+        if not cookies_file or not os.path.exists(cookies_file):
+            return
+        with open(cookies_file, "rb") as fh:
+            for c in pickle.load(fh):
+                # Selenium cookie dicts: name, value, domain, path, secure, expiry …
+                domain = "" if self.base_url else c.get("domain", "")
+                self.session.cookies.set(c["name"], c["value"], domain=domain,
+                                         path=c.get("path", "/"))
+
+    def url(self, url: str) -> str:
+        if not self.base_url:
+            return url
+        base, parts = urlsplit(self.base_url), urlsplit(url)
+        return urlunsplit((base.scheme, base.netloc, base.path + parts.path, parts.query, ""))
+
+    def close(self):
+        self.session.close()
+
+    def scrape(self, url, dest_dir):
+        """Fetch the page and stream its WAV into `dest_dir`; return (meta, Download)."""
+        url = self.url(url)
+        with span("page_load", url=url):
+            page = self.session.get(url, timeout=self.timeout)
+        if page.status_code in (401, 403) or "/login" in urlsplit(page.url).path:
+            raise NeedsBrowser("not logged in (refresh clipcafe_cookies.pkl)")
+        page.raise_for_status()
+
+        with span("extract_meta"):
+            meta = extract_meta(page.text)
+        method, target, fields = resolve_wav(page.text, page.url)
+
+        with span("download_wait"):
+            dl = self._stream(method, target, fields, pathlib.Path(dest_dir), referer=page.url)
+        count("bytes_downloaded", dl.size)
+        return meta, dl
+
+    def _stream(self, method, target, fields, dest_dir, referer) -> Download:
+        kw = {"data": fields} if method == "post" else {"params": fields}
+        resp = self.session.request(method, target, stream=True, timeout=self.timeout,
+                                    headers={"Referer": referer}, **kw)
+        with resp:
+            if resp.status_code in (401, 403):
+                raise NeedsBrowser(f"download refused ({resp.status_code})")
+            resp.raise_for_status()
+            if "html" in resp.headers.get("Content-Type", ""):
+                raise NeedsBrowser("download endpoint answered with a page, not audio")
+
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix=".", suffix=".wav.part")
+            h, size = hashlib.sha256(), 0
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    for chunk in resp.iter_content(CHUNK):
+                        if size == 0 and not chunk.startswith(b"RIFF"):
+                            raise NeedsBrowser("download is not a WAV file")
+                        fh.write(chunk)
+                        h.update(chunk)
+                        size += len(chunk)
+                if not size:
+                    raise NeedsBrowser("empty download")
+            except BaseException:
+                pathlib.Path(tmp).unlink(missing_ok=True)
+                raise
+        return Download(pathlib.Path(tmp), size, h.hexdigest())
+
+
+# ─── mock server (for local testing) ───────────────────────────
+def _silent_wav(seconds=0.5, sr=16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(b"\0\0" * int(seconds * sr))
+    return buf.getvalue()
+
+
+def make_mock_handler(fixtures_dir, require_cookie=None):
+    fixtures_dir = pathlib.Path(fixtures_dir)
+    wav = _silent_wav()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body=b"", ctype="text/html; charset=utf-8", headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _logged_in(self):
+            return not require_cookie or f"{require_cookie}=" in self.headers.get("Cookie", "")
+
+        def _download(self, fields):
+            if not self._logged_in():
+                self._reply(403, b"<p>log in first</p>")
+            elif fields.get("format", ["wav"])[0] != "wav":
+                self._reply(400, b"<p>unsupported format</p>")
+            else:
+                self._reply(200, wav, "audio/wav",
+                            [("Content-Disposition", 'attachment; filename="clip.wav"')])
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path.startswith("/download"):
+                self._download(parse_qs(parts.query))
+                return
+            if parts.path.startswith("/login"):
+                self._reply(200, b"<form action='/login/'><input name='user'></form>")
+                return
+            page = fixtures_dir / f"{parts.path.strip('/')}.html"
+            if not page.is_file():
+                self._reply(404, b"<p>not found</p>")
+            elif not self._logged_in():
+                self._reply(302, headers=[("Location", "/login/?" + urlencode({"next": parts.path}))])
+            else:
+                self._reply(200, page.read_bytes())
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            if urlsplit(self.path).path.startswith("/download"):
+                self._download(parse_qs(body))
+            else:
+                self._reply(404, b"<p>not found</p>")
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Serve fixture clip pages as a mock clip.cafe.")
+    p.add_argument("--fixtures", type=pathlib.Path, default=FIXTURES_DIR)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--require_cookie", default=None,
+                   help="only serve pages/downloads to requests carrying this cookie")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_mock_handler(args.fixtures, args.require_cookie))
+    print(f"🎬 mock clip.cafe on http://{args.host}:{args.port}/ "
+          f"({', '.join(sorted(p.stem for p in args.fixtures.glob('*.html')))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Kimi-Audio runner with token caches and multi-turn state.
+
+`KimiAudio.generate` re-tokenizes every message of the chat on every call:
+the discrete GLM-4 voice tokens and the Whisper features of each audio
+file, and the text tokens of each text message. KimiRunner memoizes those
+three prompt-manager steps:
+
+  • audio → keyed by the file's sha256, so a re-written or temp copy of the
+            same bytes is still a hit; discrete tokens are also kept on disk
+            (KIMI_CACHE_DIR, default kimi_cache/<model hash>/) across runs
+  • text  → keyed by the string
+
+A `Conversation` keeps the message list between turns, so turn N only
+encodes the audio that is new in turn N (the user's clip and the previous
+answer's audio); everything earlier is a cache hit.
+
+USAGE
+    python kimi_runner.py --input_dir Lines                      # one turn per clip
+    python kimi_runner.py --input_dir Lines --followup "Which movie is it from?"
+    python kimi_runner.py --input_dir Lines --conversation       # all clips, one chat
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import statistics
+import time
+from collections import OrderedDict
+
+from audio_cache import file_hash
+from result_cache import ResultCache
+from result_sink import ResultSink, export_json
+import telemetry
+from telemetry import count, span
+
+MODEL_PATH     = "moonshotai/Kimi-Audio-7B-Instruct"
+CACHE_DIR      = pathlib.Path(os.environ.get("KIMI_CACHE_DIR", "kimi_cache"))
+DEFAULT_PROMPT = "Can you figure out who this speaker is?"
+DEFAULT_OUTPUT = pathlib.Path("kimi_results.json")
+CONVERSATION_OUTPUT = pathlib.Path("kimi_conversation.json")
+OUTPUT_SR      = 24000     # Kimi-Audio detokenizer rate
+MEMORY_ITEMS   = 512       # per cache, least recently used dropped first
+
+SAMPLING_PARAMS = {
+    "audio_temperature": 0.8,
+    "audio_top_k": 10,
+    "text_temperature": 0.0,
+    "text_top_k": 5,
+    "audio_repetition_penalty": 1.0,
+    "audio_repetition_window_size": 64,
+    "text_repetition_penalty": 1.0,
+    "text_repetition_window_size": 16,
+}
+
+
+class _Memo:
+    """Small LRU dict with hit/miss counters and time spent on misses."""
+
+    def __init__(self, name, max_items=MEMORY_ITEMS):
+        self.name, self.max_items = name, max_items
+        self._items = OrderedDict()
+        self.hits = self.misses = 0
+        self.miss_s = 0.0
+
+    def get(self, key, compute):
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            count(f"kimi_{self.name}_hits")
+            return self._items[key]
+        t0 = time.perf_counter()
+        with span(f"kimi_tokenize_{self.name}"):
+            value = compute()
+        self.miss_s += time.perf_counter() - t0
+        self.misses += 1
+        self._items[key] = value
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "encode_s": round(self.miss_s, 2)}
+
+
+class KimiRunner:
+    """KimiAudio with content-hash caches in front of its prompt tokenizers."""
+
+    def __init__(self, model_path=MODEL_PATH, load_detokenizer=False, cache_dir=CACHE_DIR):
+        from kimia_infer.api.kimia import KimiAudio
+
+        with span("kimi_load"):
+            self.model = KimiAudio(model_path=model_path, load_detokenizer=load_detokenizer)
+        self.model_path = model_path
+        # tokens depend on the checkpoint's audio tokenizer, so each model gets its own folder
+        model_key = hashlib.sha256(str(model_path).encode("utf-8")).hexdigest()[:16]
+        self.cache_dir = pathlib.Path(cache_dir) / model_key if cache_dir else None
+        self.audio_tokens = _Memo("audio")
+        self.whisper = _Memo("whisper")
+        self.text = _Memo("text")
+        self._hashes = {}
+        self._install(self.model.prompt_manager)
+
+    # ── caches ──
+    def _install(self, pm):
+        """Wrap the prompt manager's per-message tokenizers (instance attributes only)."""
+        hooks = {"_tokenize_audio": self._cached_audio_tokens,
+                 "extract_whisper_feat": self._cached_whisper,
+                 "_tokenize_text": self._cached_text}
+        for attr, make in hooks.items():
+            if hasattr(pm, attr):
+                setattr(pm, attr, make(getattr(pm, attr)))
+            else:
+                print(f"⚠️ kimia_infer prompt manager has no {attr}; not cached")
+
+    def _digest(self, path) -> str:
+        # (path, mtime, size) → sha256, so a turn re-sent with the same file isn't re-hashed
+        st = os.stat(path)
+        stamp = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        if stamp not in self._hashes:
+            self._hashes[stamp] = file_hash(path)
+        return self._hashes[stamp]
+
+    def _cached_audio_tokens(self, tokenize):
+        def wrapper(wav_path):
+            digest = self._digest(wav_path)
+            return self.audio_tokens.get(digest, lambda: self._disk_tokens(digest, wav_path, tokenize))
+        return wrapper
+
+    def _disk_tokens(self, digest, wav_path, tokenize):
+        path = self.cache_dir / f"{digest}.json" if self.cache_dir else None
+        if path is not None and path.exists():
+            return json.loads(path.read_text())
+        tokens = tokenize(wav_path)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(tokens))
+            os.replace(tmp, path)
+        return tokens
+
+    def _cached_whisper(self, extract):
+        def wrapper(wav, *args, **kwargs):
+            if not isinstance(wav, (str, os.PathLike)):
+                return extract(wav, *args, **kwargs)
+            return self.whisper.get(self._digest(wav), lambda: extract(wav, *args, **kwargs))
+        return wrapper
+
+    def _cached_text(self, tokenize):
+        def wrapper(text, *args, **kwargs):
+            if args or kwargs:
+                return tokenize(text, *args, **kwargs)
+            return self.text.get(text, lambda: tokenize(text))
+        return wrapper
+
+    def stats(self) -> dict:
+        return {"audio_tokens": self.audio_tokens.stats(), "whisper": self.whisper.stats(),
+                "text": self.text.stats()}
+
+    # ── generation ──
+    def generate(self, messages, output_type="text", **params):
+        """(wav tensor or None, text, seconds) for a KimiAudio chat."""
+        t0 = time.perf_counter()
+        with span("kimi_generate", output_type=output_type, messages=len(messages)):
+            wav, text = self.model.generate(messages, **{**SAMPLING_PARAMS, **params},
+                                            output_type=output_type)
+        return wav, text, time.perf_counter() - t0
+
+    def conversation(self, out_dir=None, **params) -> "Conversation":
+        return Conversation(self, out_dir, **params)
+
+
+class Conversation:
+    """
+    Multi-turn chat that keeps its history; each answer is appended as an
+    assistant turn ("audio-text" when audio was generated, else "text").
+    """
+
+    def __init__(self, runner: KimiRunner, out_dir=None, **params):
+        self.runner, self.params = runner, params
+        self.out_dir = pathlib.Path(out_dir) if out_dir else None
+        self.messages = []
+        self.latencies = []
+
+    def ask(self, audio=None, text=None, output_type="text"):
+        """Add a user turn (text and/or audio path), generate; return (wav, text)."""
+        if text:
+            self.messages.append({"role": "user", "message_type": "text", "content": text})
+        if audio:
+            self.messages.append({"role": "user", "message_type": "audio", "content": str(audio)})
+        wav, answer, seconds = self.runner.generate(self.messages, output_type, **self.params)
+        self.latencies.append(seconds)
+
+        if wav is not None and output_type == "both" and self.out_dir is not None:
+            import soundfile as sf
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            wav_path = self.out_dir / f"turn_{len(self.latencies):02d}.wav"
+            sf.write(wav_path, wav.detach().cpu().view(-1).numpy(), OUTPUT_SR)
+            self.messages.append({"role": "assistant", "message_type": "audio-text",
+                                  "content": [str(wav_path), answer]})
+        else:
+            self.messages.append({"role": "assistant", "message_type": "text", "content": answer})
+        return wav, answer
+
+
+# ─── batch CLI ─────────────────────────────────────────────────
+def _ms(xs) -> str:
+    if not xs:
+        return "-"
+    xs = sorted(xs)
+    return (f"p50 {statistics.median(xs) * 1000:.0f} ms, "
+            f"p95 {xs[int(0.95 * (len(xs) - 1))] * 1000:.0f} ms, n={len(xs)}")
+
+
+def run_batch(runner, wav_paths, root, prompt, followups, out_path):
+    """One conversation per clip: the prompt + clip, then each follow-up question."""
+    jsonl_path = out_path.with_suffix(".jsonl")
+    cache = ResultCache()
+    params = {**SAMPLING_PARAMS, "followups": followups}
+    model_path = runner.model_path
+    turn_latency = {}
+    with ResultSink(jsonl_path) as sink:
+        for idx, wav_path in enumerate(wav_paths, 1):
+            rel = wav_path.relative_to(root).as_posix()
+            key, meta = cache.entry_for_file(wav_path, prompt, model_path, params)
+            cached = cache.get(key)
+            if cached is not None:
+                sink.write(rel, cached)
+                print(f"[{idx}/{len(wav_paths)}] ⏭️  {rel} (cached)")
+                continue
+            convo = runner.conversation()
+            try:
+                answers = [convo.ask(audio=wav_path, text=prompt)[1]]
+                for question in followups:
+                    answers.append(convo.ask(text=question)[1])
+            except Exception as exc:
+                print(f"[{idx}/{len(wav_paths)}] ❌ {rel}: {exc}")
+                sink.write(rel, f"ERROR: {exc}")
+                continue
+            result = answers[0] if not followups else "\n".join(answers)
+            for turn, seconds in enumerate(convo.latencies, 1):
+                turn_latency.setdefault(turn, []).append(seconds)
+            print(f"[{idx}/{len(wav_paths)}] ✅ {rel}: {answers[0][:80]}  "
+                  f"({' / '.join(f'{s * 1000:.0f}' for s in convo.latencies)} ms)")
+            sink.write(rel, result)
+            cache.put(key, result, **meta)
+    export_json(jsonl_path, out_path)
+    return turn_latency
+
+
+def plan(wav_paths, root, prompt, followups, model_path=MODEL_PATH):
+    """Clips run_batch would still run (no cached answer); loads no model."""
+    cache = ResultCache(readonly=True)
+    params = {**SAMPLING_PARAMS, "followups": followups}
+    pending = [p.relative_to(root).as_posix() for p in wav_paths
+               if cache.get(cache.key_for_file(p, prompt, model_path, params)) is None]
+    print(f"{len(wav_paths) - len(pending)} cached, {len(pending)} to run "
+          f"({1 + len(followups)} turn(s) each)")
+    for rel in pending:
+        print(f"  • {rel}")
+    return pending
+
+
+def run_conversation(runner, wav_paths, root, prompt, out_path):
+    """
+    All clips as successive turns of one chat; turn N only encodes clip N.
+    Each turn's answer is written through the sink as it arrives. Answers
+    depend on the earlier turns, so they are not put in the result cache.
+    """
+    jsonl_path = out_path.with_suffix(".jsonl")
+    convo = runner.conversation(out_path.with_suffix(""))
+    with ResultSink(jsonl_path) as sink:
+        for idx, wav_path in enumerate(wav_paths, 1):
+            rel = wav_path.relative_to(root).as_posix()
+            try:
+                _, answer = convo.ask(audio=wav_path, text=prompt if idx == 1 else None)
+            except Exception as exc:
+                print(f"[turn {idx}] ❌ {rel}: {exc}")
+                sink.write(rel, f"ERROR: {exc}", turn=idx)
+                break
+            print(f"[turn {idx}] {rel}: {answer[:80]}  ({convo.latencies[-1] * 1000:.0f} ms)")
+            sink.write(rel, answer, turn=idx, model=runner.model_path)
+    export_json(jsonl_path, out_path)
+    return {turn: [s] for turn, s in enumerate(convo.latencies, 1)}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Batch Kimi-Audio over a folder of WAVs.")
+    p.add_argument("--input_dir", type=pathlib.Path, default=pathlib.Path("Lines"))
+    p.add_argument("--output_file", type=pathlib.Path, default=None,
+                   help=f"default: {DEFAULT_OUTPUT}, or {CONVERSATION_OUTPUT} with --conversation")
+    p.add_argument("--prompt", default=DEFAULT_PROMPT)
+    p.add_argument("--followup", action="append", default=[],
+                   help="extra text turn after the clip's answer (repeatable)")
+    p.add_argument("--conversation", action="store_true",
+                   help="feed all clips as turns of a single conversation")
+    p.add_argument("--model_path", default=MODEL_PATH)
+    p.add_argument("--limit", type=int, default=None, help="only the first N clips")
+    p.add_argument("--trace", type=pathlib.Path, default=None,
+                   help="write a Chrome trace + per-stage summary here")
+    p.add_argument("--dry_run", action="store_true",
+                   help="only list the clips that would be run")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.output_file is None:
+        args.output_file = CONVERSATION_OUTPUT if args.conversation else DEFAULT_OUTPUT
+    if args.trace:
+        telemetry.enable(args.trace)
+    wav_paths = sorted(args.input_dir.rglob("*.wav"))[:args.limit]
+    print(f"🔍 {len(wav_paths)} clips under {args.input_dir}")
+    if args.dry_run:
+        plan(wav_paths, args.input_dir, args.prompt, args.followup, args.model_path)
+        return
+    runner = KimiRunner(args.model_path)
+
+    if args.conversation:
+        latency = run_conversation(runner, wav_paths, args.input_dir, args.prompt,
+                                   args.output_file)
+    else:
+        latency = run_batch(runner, wav_paths, args.input_dir, args.prompt,
+                            args.followup, args.output_file)
+
+    for turn, seconds in sorted(latency.items()):
+        print(f"⏱️ turn {turn}: {_ms(seconds)}")
+    for name, s in runner.stats().items():
+        print(f"♻️ {name}: {s['hits']} hits, {s['misses']} encoded ({s['encode_s']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat-completions endpoint.
+
+Answers POST /v1/chat/completions with a canned gpt-4o-audio style reply
+(choices[0].message.audio.transcript) after `--latency_ms`. It can also
+fail on purpose, so openai_test's retry loop and TokenBucket run without
+an API key or network:
+
+  --fail_first N    the first N attempts for each distinct audio payload
+                    get an error, alternating 429 and 503
+  --fail_rate P     every request fails with probability P
+
+GET /stats reports requests, failures, successes and the highest number
+of requests started in any one-second window (bounded by openai_test's --rps
+burst).
+
+USAGE
+    python openai_stub.py --port 8767 --fail_first 2
+    OPENAI_API_KEY=stub python openai_test.py --async --base_url http://127.0.0.1:8767/v1 \\
+        --output_file /tmp/stub_results.json
+    python openai_stub.py --check          # does both in-process on a few clips
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8767
+FAIL_STATUSES = (429, 503)
+
+
+class StubState:
+    def __init__(self, fail_first=0, fail_rate=0.0, latency_ms=50, seed=0):
+        self.fail_first = fail_first
+        self.fail_rate = fail_rate
+        self.latency = latency_ms / 1000
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._attempts = {}        # audio digest → attempts so far
+        self.starts = []
+        self.failed = {status: 0 for status in FAIL_STATUSES}
+        self.ok = 0
+
+    def decide(self, digest) -> int:
+        """HTTP status for this attempt."""
+        with self._lock:
+            self.starts.append(time.monotonic())
+            n = self._attempts[digest] = self._attempts.get(digest, 0) + 1
+            if n <= self.fail_first or self._rng.random() < self.fail_rate:
+                status = FAIL_STATUSES[(n - 1) % len(FAIL_STATUSES)]
+                self.failed[status] += 1
+                return status
+            self.ok += 1
+            return 200
+
+    def peak_rps(self) -> int:
+        """Most requests started within any one-second window."""
+        starts, best, lo = sorted(self.starts), 0, 0
+        for hi, t in enumerate(starts):
+            while t - starts[lo] >= 1.0:
+                lo += 1
+            best = max(best, hi - lo + 1)
+        return best
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": len(self.starts), "ok": self.ok,
+                    "failed": {str(k): v for k, v in self.failed.items()},
+                    "peak_rps": self.peak_rps()}
+
+
+def _audio_digest(body: dict) -> str:
+    for msg in body.get("messages", []):
+        for part in msg.get("content", []) if isinstance(msg.get("content"), list) else []:
+            if part.get("type") == "input_audio":
+                return hashlib.sha256(part["input_audio"]["data"].encode()).hexdigest()
+    return ""
+
+
+def _completion(model, transcript) -> dict:
+    return {
+        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {
+            "role": "assistant", "content": None,
+            "audio": {"id": "audio-stub", "data": "", "expires_at": 0, "transcript": transcript},
+        }}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload, headers=()):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._reply(200, state.stats())
+            else:
+                self._reply(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._reply(404, {"error": {"message": "not found"}})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            digest = _audio_digest(body)
+            status = state.decide(digest)
+            time.sleep(state.latency)
+            if status == 429:
+                self._reply(429, {"error": {"message": "stub rate limit", "type": "rate_limit_error"}},
+                            [("Retry-After", "0")])
+            elif status != 200:
+                self._reply(status, {"error": {"message": "stub overloaded", "type": "server_error"}})
+            else:
+                self._reply(200, _completion(body.get("model", "stub"),
+                                             f"stub transcript for audio {digest[:12]}"))
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(state, host="127.0.0.1", port=DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Start the stub on a background thread; port 0 picks a free one."""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ─── check ─────────────────────────────────────────────────────
+def check(root_dir="audio_files", limit=6, fail_first=2, rps=4.0, concurrency=4) -> bool:
+    """
+    Run openai_test's async pipeline on `limit` clips against an in-process
+    stub that fails the first attempts; True if every clip succeeded after
+    retrying and the request rate stayed within the token bucket's budget.
+    Results, noised copies and the result cache go to a temp dir, never
+    the real ones.
+    """
+    import asyncio
+    import os
+    import pathlib
+    import shutil
+    import tempfile
+
+    from openai import AsyncOpenAI
+
+    import openai_test
+    from augment import OUT_ROOT
+    from result_cache import ResultCache
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="openai_stub_"))
+    root = tmp / "clips"
+    jobs = openai_test._list_actor_files(root_dir)[:limit]
+    for actor, name, path in jobs:
+        (root / actor).mkdir(parents=True, exist_ok=True)
+        shutil.copy(path, root / actor / name)
+
+    state = StubState(fail_first=fail_first, latency_ms=20)
+    server = serve(state, port=0)
+    openai_test._result_cache = ResultCache(tmp / "cache.sqlite")
+    openai_test.NOISED_ROOT = tmp / "noised"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    aclient = AsyncOpenAI(base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    t0 = time.perf_counter()
+    try:
+        results = asyncio.run(openai_test.process_actor_audio_files_async(
+            root, tmp / "results.json", concurrency=concurrency, rps=rps, aclient=aclient,
+            max_retries=fail_first + 1, base_delay=0.05))
+    finally:
+        server.shutdown()
+        openai_test._result_cache.close()
+        openai_test._result_cache = None
+        openai_test.NOISED_ROOT = OUT_ROOT
+    elapsed = time.perf_counter() - t0
+
+    stats = state.stats()
+    answered = sum(len(v) for v in results.values())
+    # a full bucket lets `concurrency` start at once, then `rps` per second
+    budget = concurrency + rps
+    print(f"{len(jobs)} clips, {answered} answered in {elapsed:.1f}s; stub saw "
+          f"{stats['requests']} requests ({stats['failed']} failed, {stats['ok']} ok), "
+          f"peak {stats['peak_rps']} starts/s (budget {budget:g}), "
+          f"{stats['requests'] - stats['ok']} retried")
+    shutil.rmtree(tmp, ignore_errors=True)
+    return (answered == len(jobs)
+            and stats["ok"] == len(jobs)
+            and stats["requests"] == len(jobs) * (fail_first + 1)
+            and stats["peak_rps"] <= budget)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Local stub of the OpenAI chat-completions API.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--fail_first", type=int, default=0,
+                   help="fail the first N attempts per audio payload (429/503)")
+    p.add_argument("--fail_rate", type=float, default=0.0,
+                   help="fail each request with this probability")
+    p.add_argument("--latency_ms", type=float, default=50)
+    p.add_argument("--check", action="store_true",
+                   help="run openai_test's async pipeline against an in-process stub and exit")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.check:
+        ok = check(fail_first=args.fail_first or 2)
+        print("✅ retries and rate limit behave" if ok else "❌ stub check failed")
+        raise SystemExit(0 if ok else 1)
+    state = StubState(args.fail_first, args.fail_rate, args.latency_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"🤖 OpenAI stub on http://{args.host}:{args.port}/v1 "
+          f"(fail_first={args.fail_first}, fail_rate={args.fail_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(state.stats()))
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
 import os
+import argparse
+import asyncio
 import base64
 import json
-from openai import OpenAI
-from add_noise import add_noise
-client = OpenAI()  # Requires OPENAI_API_KEY in environment
+import pathlib
+import random
+import time
+from add_noise import DEFAULT_SNR_DB
+from augment import OUT_ROOT, ensure_noised
+from result_cache import ResultCache
+from result_sink import ResultSink, export_json
+import telemetry
+from telemetry import count, span
+_client = None
 
 ROOT_DIR = "./audio_files"
 MODEL = "gpt-4o-audio-preview"
@@ -12,9 +21,10 @@ def encode_audio(file_path):
     with open(file_path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
-def analyze_audio(encoded_string, filename):
-    print(type(encoded_string), type(filename))
-    response = client.chat.completions.create(
+PROMPT = "Carefully listen to the audio. Try to infer the content, and the characteristics of the speaker. Note down as many attrbutes as you can."
+
+def build_request(encoded_string, prompt=PROMPT):
+    return dict(
         model=MODEL,
         modalities=["text", "audio"],
         audio={"voice": "alloy", "format": "wav"},
@@ -23,7 +33,7 @@ def analyze_audio(encoded_string, filename):
                 "role": "user",
                 "content": [
                     {"type": 
-                        "text", "text": "Carefully listen to the audio. Try to infer the content, and the characteristics of the speaker. Note down as many attrbutes as you can."},
+                        "text", "text": prompt},
                     {
                         "type": "input_audio",
                         "input_audio": {
@@ -36,10 +46,47 @@ def analyze_audio(encoded_string, filename):
         ]
     )
 
+def get_client(base_url=None):
+    """The OpenAI client, created on first use (requires OPENAI_API_KEY in environment)."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(base_url=base_url)
+    return _client
+
+def analyze_audio(encoded_string, filename):
+    print(type(encoded_string), type(filename))
+    response = get_client().chat.completions.create(**build_request(encoded_string))
+
     # print(response.choices[0].message.audio.transcript)
     return response.choices[0].message.audio.transcript
 
-def process_actor_audio_files(root_dir):
+# everything besides the audio that changes the answer; part of the cache key
+NOISE = {"noise": "whitenoise.wav", "snr_db": DEFAULT_SNR_DB}
+REQUEST_PARAMS = {"modalities": ["text", "audio"], "voice": "alloy"}
+_result_cache = None
+BASE_URL = None     # --base_url; part of the cache key so stub answers never pass as real ones
+
+def result_cache():
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
+
+def request_params():
+    return dict(REQUEST_PARAMS, base_url=BASE_URL) if BASE_URL else REQUEST_PARAMS
+
+def cache_entry(file_path):
+    """(key, put() metadata) for this clip under the current request settings."""
+    return result_cache().entry_for_file(file_path, PROMPT, MODEL, request_params(), NOISE)
+
+NOISED_ROOT = OUT_ROOT
+
+def noised_clip(file_path):
+    # precomputed by augment.py; mixed on the spot only if missing
+    return encode_audio(ensure_noised(file_path, out_root=NOISED_ROOT))
+
+def process_actor_audio_files(root_dir, sink=None):
     results = {}
 
     for actor_name in os.listdir(root_dir):
@@ -55,11 +102,22 @@ def process_actor_audio_files(root_dir):
                 file_path = os.path.join(actor_path, filename)
                 print(f"🎙️ {actor_name} - {filename}")
                 try:
-                    noised = add_noise(file_path, "whitenoise.wav")
-                    # encoded = encode_audio(file_path)
-                    result = analyze_audio(noised, filename)
+                    with span("cache_lookup"):
+                        key, meta = cache_entry(file_path)
+                        result = result_cache().get(key)
+                    if result is None:
+                        with span("noise"):
+                            noised = noised_clip(file_path)
+                        # encoded = encode_audio(file_path)
+                        with span("api_call", file=filename):
+                            result = analyze_audio(noised, filename)
+                        result_cache().put(key, result, **meta)
+                    else:
+                        print("(cached)")
                     print(result)
                     results[actor_name][filename] = result
+                    if sink is not None:
+                        sink.write(f"{actor_name}/{filename}", result)
                     print(f"✅ {filename}: {result[:100]}...\n")
                 except Exception as e:
                     print(f"❌ Error with {filename}: {e}")
@@ -69,11 +127,155 @@ def process_actor_audio_files(root_dir):
 
     return results
 
+# ─── async pipeline ─────────────────────────────────────────────
+class TokenBucket:
+    """Allow `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retryable(exc):
+    from openai import APIConnectionError, APIStatusError
+    if isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return isinstance(exc, APIConnectionError)
+
+async def analyze_audio_async(aclient, encoded_string, bucket, max_retries=5, base_delay=1.0):
+    """One request with exponential backoff (plus jitter) on 429/5xx/connection errors."""
+    for attempt in range(max_retries + 1):
+        with span("rate_limit_wait"):
+            await bucket.acquire()
+        try:
+            with span("api_call"):
+                response = await aclient.chat.completions.create(**build_request(encoded_string))
+            return response.choices[0].message.audio.transcript
+        except Exception as e:
+            if attempt == max_retries or not _retryable(e):
+                raise
+            delay = base_delay * 2 ** attempt * (1 + random.random())
+            count("retries")
+            print(f"↻ retry {attempt + 1}/{max_retries} in {delay:.1f}s ({e})")
+            await asyncio.sleep(delay)
+
+def _list_actor_files(root_dir):
+    jobs = []
+    for actor_name in sorted(os.listdir(root_dir)):
+        actor_path = os.path.join(root_dir, actor_name)
+        if not os.path.isdir(actor_path):
+            continue
+        for filename in sorted(os.listdir(actor_path)):
+            if filename.lower().endswith(".wav"):
+                jobs.append((actor_name, filename, os.path.join(actor_path, filename)))
+    return jobs
+
+async def process_actor_audio_files_async(root_dir, out_path, concurrency=8, rps=2.0,
+                                          aclient=None, max_retries=5, base_delay=1.0):
+    """
+    Concurrent version of process_actor_audio_files.
+
+    At most `concurrency` requests are in flight and at most `rps` start per
+    second. Each result is appended to <out_path>.jsonl as soon as its file
+    completes; the nested JSON is exported from that log at the end.
+    """
+    if aclient is None:
+        from openai import AsyncOpenAI
+        aclient = AsyncOpenAI(max_retries=0)  # we do our own backoff
+    sem = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rps, burst=concurrency)
+    jsonl_path = pathlib.Path(out_path).with_suffix(".jsonl")
+    jobs = _list_actor_files(root_dir)
+    results = {actor: {} for actor, _, _ in jobs}
+
+    async def run(actor_name, filename, file_path):
+        async with sem:
+            print(f"🎙️ {actor_name} - {filename}")
+            try:
+                key, meta = await asyncio.to_thread(cache_entry, file_path)
+                result = result_cache().get(key)
+                if result is None:
+                    noised = await asyncio.to_thread(noised_clip, file_path)
+                    result = await analyze_audio_async(aclient, noised, bucket, max_retries,
+                                                       base_delay)
+                    result_cache().put(key, result, **meta)
+                print(f"✅ {filename}: {result[:100]}...\n")
+            except Exception as e:
+                print(f"❌ Error with {filename}: {e}")
+                return
+        results[actor_name][filename] = result
+        sink.write(f"{actor_name}/{filename}", result)
+
+    with ResultSink(jsonl_path) as sink:
+        await asyncio.gather(*(run(*job) for job in jobs))
+    export_json(jsonl_path, out_path, nested=True)
+    return results
+
+def plan(root_dir):
+    """List the clips a run would send (not in the result cache yet); no API client needed."""
+    jobs = _list_actor_files(root_dir)
+    cache = ResultCache(readonly=True)
+    pending = [(actor, name) for actor, name, path in jobs
+               if cache.get(cache.key_for_file(path, PROMPT, MODEL, request_params(), NOISE)) is None]
+    print(f"{len(jobs)} clips under {root_dir}: {len(jobs) - len(pending)} cached, "
+          f"{len(pending)} to send")
+    for actor, name in pending:
+        print(f"  • {actor}/{name}")
+    return pending
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Describe actor clips with gpt-4o-audio.")
+    p.add_argument("--root_dir", default=ROOT_DIR)
+    p.add_argument("--output_file", default="gpt4o_audio_results_by_actor_noised.json")
+    p.add_argument("--async", dest="use_async", action="store_true",
+                   help="send requests concurrently with the async client")
+    p.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    p.add_argument("--rps", type=float, default=2.0, help="max requests started per second")
+    p.add_argument("--max_retries", type=int, default=5, help="retries on 429/5xx")
+    p.add_argument("--base_url", default=None,
+                   help="API base URL (e.g. a local stub server)")
+    p.add_argument("--trace", default=None,
+                   help="write a Chrome trace + per-stage summary here")
+    p.add_argument("--dry_run", action="store_true",
+                   help="only list the clips that would be sent")
+    return p.parse_args()
+
 if __name__ == "__main__":
-    all_results = process_actor_audio_files(ROOT_DIR)
+    args = parse_args()
+    BASE_URL = args.base_url
+    if args.dry_run:
+        plan(args.root_dir)
+        raise SystemExit
+    if args.trace:
+        telemetry.enable(args.trace)
+    if args.use_async:
+        from openai import AsyncOpenAI
+        aclient = AsyncOpenAI(base_url=args.base_url, max_retries=0)
+        asyncio.run(process_actor_audio_files_async(
+            args.root_dir, args.output_file, args.concurrency, args.rps,
+            aclient=aclient, max_retries=args.max_retries))
+        print(f"📝 Saved all results to {args.output_file}")
+        raise SystemExit
+
+    get_client(args.base_url)
+    jsonl_path = pathlib.Path(args.output_file).with_suffix(".jsonl")
+    with ResultSink(jsonl_path) as sink:
+        process_actor_audio_files(args.root_dir, sink)
 
-    # Save results to JSON
-    with open("gpt4o_audio_results_by_actor_noised.json", "w") as f:
-        json.dump(all_results, f, indent=2)
+    # Export the per-file log to the nested per-actor JSON
+    export_json(jsonl_path, args.output_file, nested=True)
 
-    print("📝 Saved all results to gpt4o_audio_results_by_actor.json")
+    print(f"📝 Saved all results to {args.output_file}")
@@ -0,0 +1,187 @@
+"""
+KV prefix cache for repeated Qwen2-Audio prompts.
+
+Every clip in a run shares the text in front of the audio: the system turn
+and "Audio 1:" of the chat template (qwen_test_Ata) or the whole
+instruction (qwen_test.py). Under causal attention the key/value states of
+those tokens do not depend on anything after them, so they are computed
+once per (model, prompt prefix) and copied into each clip's generate call.
+Only the audio tokens, the text after them and the decode run per clip.
+The question that follows the audio in the chat template still has to be
+recomputed, because it attends to the audio.
+
+    cache = PrefixCache(model)
+    out = cache.generate(inputs, prompt, processor, **GEN_KWARGS)   # None → not applicable
+    if out is None:
+        out = model.generate(**inputs, **GEN_KWARGS)
+
+Only single-prompt calls are served from the cache. Under left padding the
+prefix sits at different positions in each row of a batch. It needs a
+transformers version whose Qwen2-Audio processor expands <|AUDIO|> into
+one token per audio frame (4.45+). The cache is opt-in (--prefix_cache);
+`check` greedy-decodes a prompt with and without it and compares the token
+ids, so verify it against the installed transformers first:
+
+    python prefix_cache.py --stub                                   # tiny random GPT-2, no download
+    python prefix_cache.py --model_name Qwen/Qwen2-Audio-7B-Instruct --wav Lines/04.wav
+"""
+
+import argparse
+import copy
+import sys
+import time
+
+from telemetry import count, span
+
+AUDIO_MARKERS = ("<|audio_bos|>", "<|AUDIO|>")
+
+
+def static_prefix(prompt: str) -> str:
+    """The prompt text before its first audio marker ("" if it starts with audio)."""
+    cuts = [i for i in (prompt.find(m) for m in AUDIO_MARKERS) if i >= 0]
+    return prompt[:min(cuts)] if cuts else ""
+
+
+class PrefixCache:
+    def __init__(self, model):
+        self.model = model
+        self._entries = {}      # prefix text → (token ids, KV cache, prefill seconds)
+        self.saved_s = 0.0
+        self.clips = 0
+
+    def _entry(self, processor, prefix: str, device):
+        if prefix not in self._entries:
+            import torch
+            from transformers import DynamicCache
+
+            ids = processor.tokenizer(prefix, add_special_tokens=False,
+                                      return_tensors="pt").input_ids.to(device)
+            t0 = time.perf_counter()
+            with span("prefix_prefill", tokens=ids.size(1)), torch.no_grad():
+                past = self.model(input_ids=ids, use_cache=True).past_key_values
+            if not isinstance(past, DynamicCache):
+                past = DynamicCache.from_legacy_cache(past)
+            self._entries[prefix] = (ids, past, time.perf_counter() - t0)
+            print(f"   ♻️ cached {ids.size(1)} prefix tokens "
+                  f"({self._entries[prefix][2] * 1000:.0f} ms prefill)")
+        return self._entries[prefix]
+
+    def generate(self, inputs, prompt: str, processor, **gen_kwargs):
+        """`model.generate` output for one prompt, reusing the cached prefix; None if it can't."""
+        import torch
+
+        ids = inputs["input_ids"]
+        prefix = static_prefix(prompt)
+        if ids.size(0) != 1 or not prefix:
+            return None
+        prefix_ids, prefix_kv, prefill_s = self._entry(processor, prefix, ids.device)
+        n_prefix, n_prompt = prefix_ids.size(1), ids.size(1)
+        if n_prompt - n_prefix < 2 or not torch.equal(ids[:, :n_prefix], prefix_ids):
+            return None
+
+        past = copy.deepcopy(prefix_kv)
+        mask = inputs.get("attention_mask")
+        extra = {k: v for k, v in inputs.items() if k not in ("input_ids", "attention_mask")}
+        with torch.no_grad():
+            # prefill audio + trailing text except the last token: generate()
+            # needs one uncached token to produce the first new one
+            self.model(input_ids=ids[:, n_prefix:-1],
+                       attention_mask=mask[:, :-1] if mask is not None else None,
+                       past_key_values=past, use_cache=True,
+                       cache_position=torch.arange(n_prefix, n_prompt - 1, device=ids.device),
+                       **extra)
+            out = self.model.generate(input_ids=ids, attention_mask=mask,
+                                      past_key_values=past, **gen_kwargs)
+
+        self.saved_s += prefill_s
+        self.clips += 1
+        count("prefix_tokens_reused", n_prefix)
+        print(f"   ♻️ {n_prefix}/{n_prompt} prompt tokens from the prefix cache, "
+              f"~{prefill_s * 1000:.0f} ms prefill saved")
+        return out
+
+    def report(self) -> str:
+        if not self.clips:
+            return "prefix cache: not used"
+        return (f"prefix cache: {self.clips} clips, ~{self.saved_s:.1f}s prefill saved "
+                f"(~{self.saved_s / self.clips * 1000:.0f} ms/clip)")
+
+
+# ─── equivalence check ────────────────────────────────────────
+SAMPLING_KEYS = ("do_sample", "temperature", "top_p", "top_k")
+
+
+def check(model, processor, inputs, prompt, **gen_kwargs) -> bool:
+    """Greedy-decode `inputs` with and without the prefix cache; True if the token ids match."""
+    import torch
+
+    gen_kwargs = {k: v for k, v in gen_kwargs.items() if k not in SAMPLING_KEYS}
+    with torch.no_grad():
+        plain = model.generate(**inputs, do_sample=False, **gen_kwargs)
+    cached = PrefixCache(model).generate(inputs, prompt, processor, do_sample=False, **gen_kwargs)
+    if cached is None:
+        raise ValueError("prompt is not servable from the prefix cache")
+    return plain.shape == cached.shape and bool(torch.equal(plain, cached))
+
+
+class _CharTokenizer:
+    """Stand-in tokenizer for the stub check: one id per character."""
+
+    def __call__(self, text, add_special_tokens=False, return_tensors="pt"):
+        import torch
+        from types import SimpleNamespace
+
+        return SimpleNamespace(input_ids=torch.tensor([[1 + ord(c) % 900 for c in text]]))
+
+
+def _stub_case():
+    """Tiny random GPT-2 (as in bench.py), a char tokenizer and 40 fake audio tokens."""
+    import torch
+    from types import SimpleNamespace
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=1024, n_positions=512, n_embd=64, n_layer=2,
+                                       n_head=2, bos_token_id=0, eos_token_id=0)).eval()
+    processor = SimpleNamespace(tokenizer=_CharTokenizer())
+    prompt = "<|im_start|>system\nYou are a helpful assistant.<|AUDIO|> Who is speaking?"
+    head, tail = prompt.split("<|AUDIO|>")
+    ids = torch.cat([processor.tokenizer(head).input_ids,
+                     torch.randint(901, 1024, (1, 40)),
+                     processor.tokenizer(tail).input_ids], dim=1)
+    inputs = {"input_ids": ids, "attention_mask": torch.ones_like(ids)}
+    return model, processor, inputs, prompt, {"max_new_tokens": 32}
+
+
+def _qwen_case(model_name, wav):
+    from qwen_test_Ata import GEN_KWARGS, _build_prompt, _load_clip, device, load_model
+
+    processor, model = load_model(model_name)
+    sr = processor.feature_extractor.sampling_rate
+    audio = _load_clip(wav, sr)
+    prompt = _build_prompt(processor, audio)
+    inputs = processor(text=[prompt], audio=[audio], sampling_rate=sr,
+                       return_tensors="pt").to(device())
+    return model, processor, inputs, prompt, GEN_KWARGS
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Check that prefix-cached generation matches plain generate.")
+    p.add_argument("--stub", action="store_true", help="tiny random GPT-2, no download")
+    p.add_argument("--model_name", default="Qwen/Qwen2-Audio-7B-Instruct")
+    p.add_argument("--wav", default="Lines/04.wav")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    model, processor, inputs, prompt, gen_kwargs = (
+        _stub_case() if args.stub else _qwen_case(args.model_name, args.wav))
+    same = check(model, processor, inputs, prompt, **gen_kwargs)
+    print(f"{'✅' if same else '❌'} prefix-cached and plain greedy decoding "
+          f"{'give identical' if same else 'differ in their'} token ids")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Long-lived local Qwen2-Audio inference server.
+
+Loads the processor and model once and serves them over localhost HTTP,
+so prompt iterations don't pay the multi-minute 7B cold start. Requests
+that arrive close together are queued into micro-batches and go through
+one padded `generate` call (qwen_test_Ata.generate_answers).
+
+USAGE
+    python qwen_server.py --model_name Qwen/Qwen2-Audio-7B-Instruct --port 8765
+    python qwen_test_Ata.py --server http://127.0.0.1:8765 --input_dir Lines
+
+POST /analyse   JSON body, one of
+    {"path": "Lines/04.wav"}                                  server reads the file
+    {"pcm16_b64": "...", "sample_rate": 44100}                mono int16 PCM
+  plus optional
+    "prompt": "..."       question text (default qwen_test_Ata.QUESTION)
+    "template": "chat"    wrap the prompt in the chat template (default), or
+                "raw"     use the prompt verbatim (must contain <|AUDIO|>)
+    "gen_kwargs": {...}   generate() settings (default qwen_test_Ata.GEN_KWARGS)
+  → {"answer": "..."}
+
+GET /health → {"model": ..., "precision": ..., "gen_kwargs": {...}, "served": N}
+
+Clients call `check_server` first: the server cannot switch checkpoints,
+so a client expecting a different model refuses to run instead of
+silently getting another model's answers.
+"""
+
+import argparse
+import base64
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class MicroBatcher:
+    """
+    Single worker thread that owns the model. Callers submit() work items and
+    block on a Future; the worker takes the first waiting item, gathers
+    whatever else arrives within `max_wait` seconds (up to `max_batch`) and
+    runs them together.
+    """
+
+    def __init__(self, processor, model, max_batch=4, max_wait=0.05, gen_kwargs=None):
+        self.processor = processor
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.gen_kwargs = gen_kwargs
+        self.served = 0
+        self._q: "queue.Queue[tuple[dict, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: dict) -> Future:
+        fut: Future = Future()
+        self._q.put((item, fut))
+        return fut
+
+    def _collect(self):
+        batch = [self._q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            groups = {}
+            for item, fut in self._collect():
+                # a bad path or payload fails only its own request
+                try:
+                    audio = self._audio(item)
+                    prompt = self._prompt(item, audio)
+                    gen_kwargs = item.get("gen_kwargs") or self.gen_kwargs
+                except Exception as exc:
+                    fut.set_exception(exc)
+                    continue
+                key = json.dumps(gen_kwargs, sort_keys=True)
+                groups.setdefault(key, []).append((audio, prompt, gen_kwargs, fut))
+            for group in groups.values():
+                self._run(group)
+
+    def _run(self, group):
+        from qwen_test_Ata import generate_answers
+
+        try:
+            answers = generate_answers([a for a, _, _, _ in group], self.processor, self.model,
+                                       [p for _, p, _, _ in group], gen_kwargs=group[0][2])
+        except Exception as exc:
+            print(f"❌ generate failed for a batch of {len(group)}: {exc}")
+            for *_, fut in group:
+                fut.set_exception(exc)
+            return
+        self.served += len(group)
+        for (*_, fut), answer in zip(group, answers):
+            fut.set_result(answer)
+
+    def _audio(self, item):
+        import numpy as np
+        import soxr
+        from qwen_test_Ata import _load_clip
+
+        target_sr = self.processor.feature_extractor.sampling_rate
+        if "path" in item:
+            return _load_clip(item["path"], target_sr)
+        pcm = np.frombuffer(base64.b64decode(item["pcm16_b64"]), dtype="<i2")
+        audio = pcm.astype(np.float32) / 32768.0
+        sr = int(item.get("sample_rate", target_sr))
+        if sr != target_sr:
+            audio = soxr.resample(audio, sr, target_sr)
+        return audio[:30 * target_sr]
+
+    def _prompt(self, item, audio):
+        from qwen_test_Ata import QUESTION, _build_prompt
+
+        prompt = item.get("prompt") or QUESTION
+        if item.get("template", "chat") == "raw":
+            return prompt
+        return _build_prompt(self.processor, audio, prompt)
+
+
+def make_handler(batcher: MicroBatcher, model_name: str, precision=None):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"model": model_name, "precision": precision,
+                                  "gen_kwargs": batcher.gen_kwargs, "served": batcher.served})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/analyse":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                item = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if "path" not in item and "pcm16_b64" not in item:
+                    raise ValueError("need 'path' or 'pcm16_b64'")
+            except ValueError as exc:
+                self._reply(400, {"error": str(exc)})
+                return
+            try:
+                self._reply(200, {"answer": batcher.submit(item).result()})
+            except Exception as exc:
+                self._reply(500, {"error": str(exc)})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+# ─────────────── client ─────────────── #
+def server_info(server: str, timeout: float = 10) -> dict:
+    """The server's /health: model, precision, default gen_kwargs."""
+    with urllib.request.urlopen(server.rstrip("/") + "/health", timeout=timeout) as resp:
+        return json.load(resp)
+
+
+def check_server(server: str, model_name: str) -> dict:
+    """server_info, or SystemExit if the server is serving a different model."""
+    info = server_info(server)
+    if info.get("model") != model_name:
+        raise SystemExit(f"{server} serves {info.get('model')!r}, expected {model_name!r}; "
+                         f"start it with --model_name {model_name}")
+    return info
+
+
+def analyse_remote(server: str, payload: dict, timeout: float = 600) -> str:
+    """POST one request to a running server and return its answer."""
+    req = urllib.request.Request(
+        server.rstrip("/") + "/analyse",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.load(resp)["answer"]
+
+
+# ─────────────── CLI ─────────────── #
+def parse_args():
+    from qwen_test_Ata import DEFAULT_MODEL, PRECISIONS
+
+    p = argparse.ArgumentParser(description="Serve Qwen2-Audio over localhost HTTP.")
+    p.add_argument("--model_name", default=DEFAULT_MODEL,
+                   help="HF model name or local checkpoint")
+    p.add_argument("--precision", choices=PRECISIONS, default=None,
+                   help="see qwen_test_Ata.load_model")
+    p.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    p.add_argument("--interop_threads", type=int, default=None,
+                   help="torch inter-op threads")
+    p.add_argument("--host", default=DEFAULT_HOST)
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--max_batch", type=int, default=4,
+                   help="max requests per generate call (default: 4)")
+    p.add_argument("--max_wait_ms", type=float, default=50,
+                   help="how long to wait for a batch to fill (default: 50)")
+    return p.parse_args()
+
+
+def main():
+    from qwen_test_Ata import GEN_KWARGS, load_model
+
+    args = parse_args()
+    processor, model = load_model(args.model_name, args.precision,
+                                  args.threads, args.interop_threads)
+    batcher = MicroBatcher(processor, model, args.max_batch, args.max_wait_ms / 1000,
+                           gen_kwargs=dict(GEN_KWARGS))
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(batcher, args.model_name, args.precision))
+    print(f"Serving {args.model_name} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,46 @@
 from io import BytesIO
 from urllib.request import urlopen
-import librosa
-from transformers import AutoProcessor, Qwen2AudioForConditionalGeneration
 from pathlib import Path
+import argparse
 import os
 import base64
 import json
-from add_noise import add_noise
-model = Qwen2AudioForConditionalGeneration.from_pretrained("Qwen/Qwen2-Audio-7B" ,trust_remote_code=True)
-processor = AutoProcessor.from_pretrained("Qwen/Qwen2-Audio-7B" ,trust_remote_code=True)
+from add_noise import DEFAULT_SNR_DB
+from augment import ensure_noised
+from audio_cache import load_audio
+from result_cache import ResultCache
+from result_sink import ResultSink, export_json
+from telemetry import span  # set TRACE_FILE=trace.json to record
+MODEL_NAME = "Qwen/Qwen2-Audio-7B"
+GEN_PARAMS = {"max_length": 256}
+NOISE = {"noise": "whitenoise.wav", "snr_db": DEFAULT_SNR_DB}
+PROMPT = """Carefully listen to the audio. Try to infer the content, 
+                and the characteristics of the speaker. 
+                Note down as many attrbutes as you can.
+                
+                <|audio_bos|><|AUDIO|><|audio_eos|>"""
+# With QWEN_SERVER set (e.g. http://127.0.0.1:8765, see qwen_server.py) the
+# model stays resident in the server and this script is only a client.
+QWEN_SERVER = os.environ.get("QWEN_SERVER")
 ROOT_DIR = Path("/Users/emir/Projects/audioprivacy/audio_files")
+# not openai_test's gpt4o_* files: the two models' answers must not mix
+RESULTS_JSONL = "qwen_audio_results_by_actor_noised.jsonl"
+RESULTS_JSON = "qwen_audio_results_by_actor_noised.json"
+
+_loaded = None
+USE_PREFIX_CACHE = False    # --prefix_cache
+
+def get_model():
+    """(model, processor, prefix_cache or None), loaded on first use rather than at import."""
+    global _loaded
+    if _loaded is None:
+        from transformers import AutoProcessor, Qwen2AudioForConditionalGeneration
+        from prefix_cache import PrefixCache
+        model = Qwen2AudioForConditionalGeneration.from_pretrained(MODEL_NAME ,trust_remote_code=True)
+        processor = AutoProcessor.from_pretrained(MODEL_NAME ,trust_remote_code=True)
+        # the whole instruction precedes the audio, so its KV states can be shared by every clip
+        _loaded = model, processor, PrefixCache(model) if USE_PREFIX_CACHE else None
+    return _loaded
 
 def encode_audio(file_path):
     with open(file_path, "rb") as f:
@@ -17,15 +48,23 @@ def encode_audio(file_path):
 
 def analyze_audio(wav_path, filename):
     path = Path(wav_path)
-    prompt = """Carefully listen to the audio. Try to infer the content, 
-                and the characteristics of the speaker. 
-                Note down as many attrbutes as you can.
-                
-                <|audio_bos|><|AUDIO|><|audio_eos|>"""
-    audio, sr = librosa.load(path, sr=processor.feature_extractor.sampling_rate)
-    inputs = processor(text=prompt, audios=audio, return_tensors="pt")
+    prompt = PROMPT
+    if QWEN_SERVER:
+        from qwen_server import analyse_remote
+        return analyse_remote(QWEN_SERVER, {"path": str(path.resolve()), "prompt": prompt,
+                                            "template": "raw", "gen_kwargs": GEN_PARAMS})
+    model, processor, prefix_cache = get_model()
+    with span("load"):
+        audio, sr = load_audio(path, sr=processor.feature_extractor.sampling_rate)
+    with span("processor"):
+        inputs = processor(text=prompt, audios=audio, return_tensors="pt")
 
-    generated_ids = model.generate(**inputs, max_length=256)
+    with span("generate"):
+        generated_ids = None
+        if prefix_cache is not None:
+            generated_ids = prefix_cache.generate(inputs, prompt, processor, **GEN_PARAMS)
+        if generated_ids is None:
+            generated_ids = model.generate(**inputs, **GEN_PARAMS)
     generated_ids = generated_ids[:, inputs.input_ids.size(1):]
     response = processor.batch_decode(generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
 
@@ -34,8 +73,18 @@ def analyze_audio(wav_path, filename):
     # print(response.choices[0].message.audio.transcript)
     return response
 
-def process_actor_audio_files(root_dir):
+def cache_config():
+    """(model, params) answers are cached under: the server's when QWEN_SERVER is set."""
+    precision = None        # local runs load the default dtype
+    if QWEN_SERVER:
+        from qwen_server import server_info
+        precision = server_info(QWEN_SERVER).get("precision")
+    return MODEL_NAME, dict(GEN_PARAMS, precision=precision)
+
+def process_actor_audio_files(root_dir, sink=None):
     results = {}
+    cache = ResultCache()
+    model_name, params = cache_config()
 
     for actor_name in os.listdir(root_dir):
         actor_path = os.path.join(root_dir, actor_name)
@@ -50,11 +99,19 @@ def process_actor_audio_files(root_dir):
                 file_path = os.path.join(actor_path, filename)
                 print(f"🎙️ {actor_name} - {filename}")
                 try:
-                    noised = add_noise(file_path, "whitenoise.wav")
-                    # encoded = encode_audio(file_path)
-                    result = analyze_audio(noised, filename)
+                    key, meta = cache.entry_for_file(file_path, PROMPT, model_name, params, NOISE)
+                    result = cache.get(key)
+                    if result is None:
+                        noised = ensure_noised(file_path)
+                        # encoded = encode_audio(file_path)
+                        result = analyze_audio(noised, filename)
+                        cache.put(key, result, **meta)
+                    else:
+                        print("(cached)")
                     print(result)
                     results[actor_name][filename] = result
+                    if sink is not None:
+                        sink.write(f"{actor_name}/{filename}", result)
                     print(f"✅ {filename}: {result[:100]}...\n")
                 except Exception as e:
                     print(f"❌ Error with {filename}: {e}")
@@ -64,11 +121,49 @@ def process_actor_audio_files(root_dir):
 
     return results
 
+def plan(root_dir):
+    """List the clips a run would analyse (not in the result cache yet) without loading the model."""
+    cache = ResultCache(readonly=True)
+    model_name, params = cache_config()
+    pending = []
+    for actor_name in sorted(os.listdir(root_dir)):
+        actor_path = os.path.join(root_dir, actor_name)
+        if not os.path.isdir(actor_path):
+            continue
+        for filename in sorted(os.listdir(actor_path)):
+            if filename.lower().endswith(".wav"):
+                file_path = os.path.join(actor_path, filename)
+                if cache.get(cache.key_for_file(file_path, PROMPT, model_name, params, NOISE)) is None:
+                    pending.append(f"{actor_name}/{filename}")
+    print(f"{len(pending)} clip(s) under {root_dir} to analyse")
+    for rel in pending:
+        print(f"  • {rel}")
+    return pending
+
 if __name__ == "__main__":
-    all_results = process_actor_audio_files(ROOT_DIR)
+    p = argparse.ArgumentParser(description="Describe actor clips with Qwen2-Audio.")
+    p.add_argument("--dry_run", action="store_true",
+                   help="only list the clips that would be analysed")
+    p.add_argument("--prefix_cache", action="store_true",
+                   help="reuse the KV states of the instruction across clips "
+                        "(verify with `python prefix_cache.py --model_name ...`)")
+    args = p.parse_args()
+    USE_PREFIX_CACHE = args.prefix_cache
+    if args.dry_run:
+        plan(ROOT_DIR)
+        raise SystemExit
+    if QWEN_SERVER:
+        from qwen_server import check_server
+
+        # the server can't switch checkpoints; refuse rather than answer with another model
+        check_server(QWEN_SERVER, MODEL_NAME)
+
+    with ResultSink(RESULTS_JSONL) as sink:
+        process_actor_audio_files(ROOT_DIR, sink)
 
     # Save results to JSON
-    with open("gpt4o_audio_results_by_actor_noised.json", "w") as f:
-        json.dump(all_results, f, indent=2)
+    export_json(RESULTS_JSONL, RESULTS_JSON, nested=True)
 
-    print("📝 Saved all results to gpt4o_audio_results_by_actor.json")
+    if _loaded is not None and _loaded[2] is not None:
+        print(f"♻️ {_loaded[2].report()}")
+    print(f"📝 Saved all results to {RESULTS_JSON}")
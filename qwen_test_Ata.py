@@ -3,91 +3,273 @@ from __future__ import annotations
 
 import argparse
 import json
+import resource
+import sys
+import time
 from pathlib import Path
-from typing import Dict
-
-import librosa
-import torch
-from transformers import AutoProcessor, Qwen2AudioForConditionalGeneration
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from audio_cache import load_audio
+from audio_stream import iter_windows
+from prefix_cache import PrefixCache
+from result_cache import ResultCache
+from result_sink import ResultSink, export_json, load_records, seed_from_json
+from scheduler import duration, length_batches
+import telemetry
+from telemetry import count, span
 
 DEFAULT_MODEL = "Qwen/Qwen2-Audio-7B-Instruct"
 DEFAULT_INPUT_DIR = Path("/Lines")
 DEFAULT_OUTPUT_FILE = Path("qwen_test.json")
+QUESTION = "Can you figure out who this speaker is?"
+GEN_KWARGS = {"max_new_tokens": 128, "do_sample": True, "temperature": 0.7}
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+# torch / transformers are imported on first use, so listing, resuming and
+# --dry_run don't pay for them
+_device: Optional[str] = None
+
+
+def device() -> str:
+    global _device
+    if _device is None:
+        import torch
+        if torch.cuda.is_available():
+            _device = "cuda"
+        elif torch.backends.mps.is_available():
+            _device = "mps"
+        else:
+            _device = "cpu"
+    return _device
+
 
-if torch.cuda.is_available():
-    DEVICE = "cuda"  
-elif torch.backends.mps.is_available():
-    DEVICE = "mps" 
-else:
-    DEVICE = "cpu"
+def _rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
 
-def load_model(model_name: str = DEFAULT_MODEL):
-    print(f"Loading {model_name} on {DEVICE.upper()} …")
+
+def set_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None):
+    import torch
+
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:   # only allowed before any parallel work ran
+            print(f"Could not set inter-op threads: {e}")
+    print(f"   🧵 threads: intra-op {torch.get_num_threads()}, "
+          f"inter-op {torch.get_num_interop_threads()}")
+
+
+def load_model(
+    model_name: str = DEFAULT_MODEL,
+    precision: Optional[str] = None,
+    threads: Optional[int] = None,
+    interop_threads: Optional[int] = None,
+    prefix_cache: bool = False,
+):
+    """
+    precision=None keeps the old behaviour (fp16 on MPS, fp32 elsewhere).
+    "bf16" casts the weights, "int8" applies torch dynamic quantization to
+    the Linear layers (CPU only). prefix_cache=True makes single-clip
+    generate calls reuse the KV states of the prompt text before the audio
+    (see prefix_cache.py).
+    """
+    import torch
+    from transformers import AutoProcessor, Qwen2AudioForConditionalGeneration
+
+    dev = device()
+    # fail before the multi-GB download / load, not after it
+    if precision is not None and precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+    if precision == "int8" and dev != "cpu":
+        raise ValueError(f"int8 dynamic quantization is CPU-only (device is {dev})")
+    print(f"Loading {model_name} on {dev.upper()} …")
+    if dev == "cpu":
+        set_threads(threads, interop_threads)
+    t0 = time.perf_counter()
 
     processor = AutoProcessor.from_pretrained(model_name)
 
-    dtype = torch.float16 if DEVICE == "mps" else None
+    if precision == "bf16":
+        dtype = torch.bfloat16
+    elif precision in ("fp32", "int8"):
+        dtype = torch.float32
+    else:
+        dtype = torch.float16 if dev == "mps" else None
     model = Qwen2AudioForConditionalGeneration.from_pretrained(
         model_name,
         torch_dtype=dtype,
-    ).to(DEVICE)
+    ).to(dev)
     model.eval()
 
-    return processor, model
+    if precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    if prefix_cache:
+        model.prefix_cache = PrefixCache(model)
 
+    print(f"   ⏱️ Loaded in {time.perf_counter() - t0:.1f}s "
+          f"({precision or 'default'}), peak RSS {_rss_mb():.0f} MB")
+    return processor, model
 
-def analyse_clip(wav_path: Path, processor, model) -> str:
-    """Run a single WAV through the model and return its answer."""
-    target_sr = processor.feature_extractor.sampling_rate
-    audio, _ = librosa.load(wav_path, sr=target_sr, mono=True)
 
-    max_len = 30 * target_sr
-    audio = audio[:max_len]
+def _load_clip(wav_path: Path, target_sr: int):
+    # decoded/resampled once, then memory-mapped from the shared cache
+    with span("load", path=wav_path):
+        audio, _ = load_audio(wav_path, sr=target_sr, max_seconds=30)
+    return audio
 
-    print(f"   🔍 Audio shape: {audio.shape}, SR: {target_sr}")
 
+def _build_prompt(processor, audio, question: str = QUESTION) -> str:
     # Build multi-modal chat template
     conversation = [
         {
             "role": "user",
             "content": [
                 {"type": "audio", "audio": audio},
-                {"type": "text", "text": "Can you figure out who this speaker is?"},
+                {"type": "text", "text": question},
             ],
         }
     ]
-    text_prompt = processor.apply_chat_template(
+    return processor.apply_chat_template(
         conversation, add_generation_prompt=True, tokenize=False
     )
-    print(f"   🔍 Generated prompt length: {len(text_prompt)} characters")
 
-    inputs = processor(
-        text=text_prompt,
-        audio=[audio],
-        sampling_rate=target_sr, 
-        return_tensors="pt",
-        padding=True,
-    ).to(DEVICE)
+
+def generate_answers(
+    audios, processor, model, text_prompts: Optional[List[str]] = None,
+    gen_kwargs: Optional[dict] = None,
+) -> List[str]:
+    """Run several mono arrays through one padded `generate` call, answers in order."""
+    import torch
+
+    gen_kwargs = GEN_KWARGS if gen_kwargs is None else gen_kwargs
+    target_sr = processor.feature_extractor.sampling_rate
+    for audio in audios:
+        print(f"   🔍 Audio shape: {audio.shape}, SR: {target_sr}")
+
+    if text_prompts is None:
+        text_prompts = [_build_prompt(processor, audio) for audio in audios]
+    print(f"   🔍 Generated prompt length: {len(text_prompts[0])} characters")
+
+    # decoder-only generation needs the padding on the left
+    processor.tokenizer.padding_side = "left"
+    with span("processor", batch=len(audios)):
+        inputs = processor(
+            text=text_prompts,
+            audio=audios,
+            sampling_rate=target_sr, 
+            return_tensors="pt",
+            padding=True,
+        ).to(device())
 
     input_len = inputs.input_ids.size(1)
-    print(f"   🔍 Input tokens: {input_len}")
+    print(f"   🔍 Input tokens: {input_len} x {len(audios)}")
 
     # Generate
-    with torch.no_grad():
-        generated = model.generate(
-            **inputs,
-            max_new_tokens=128,
-            do_sample=True,
-            temperature=0.7,
-        )
+    t0 = time.perf_counter()
+    prefix_cache = getattr(model, "prefix_cache", None)
+    with span("generate", batch=len(audios)), torch.no_grad():
+        generated = None
+        if prefix_cache is not None:
+            generated = prefix_cache.generate(inputs, text_prompts[0], processor, **gen_kwargs)
+        if generated is None:
+            generated = model.generate(**inputs, **gen_kwargs)
+    elapsed = time.perf_counter() - t0
 
     generated = generated[:, input_len:]
-    response = processor.batch_decode(
-        generated, skip_special_tokens=True, clean_up_tokenization_spaces=False
-    )[0].strip()
+    pad_id = processor.tokenizer.pad_token_id
+    n_new = int((generated != pad_id).sum()) if pad_id is not None else generated.numel()
+    print(f"   ⏱️ {n_new} tokens in {elapsed:.1f}s ({n_new / elapsed:.1f} tok/s)")
+    count("generated_tokens", n_new)
+    with span("decode"):
+        responses = processor.batch_decode(
+            generated, skip_special_tokens=True, clean_up_tokenization_spaces=False
+        )
+
+    answers = []
+    for response in responses:
+        response = response.strip()
+        print(f"   Generated: '{response[:100]}{'…' if len(response) > 100 else ''}'")
+        answers.append(response or "No response generated")
+    return answers
+
+
+def analyse_batch(wav_paths: List[Path], processor, model) -> List[str]:
+    """Run several WAVs through one padded `generate` call, answers in order."""
+    target_sr = processor.feature_extractor.sampling_rate
+    return generate_answers([_load_clip(p, target_sr) for p in wav_paths], processor, model)
+
 
-    print(f"   Generated: '{response[:100]}{'…' if len(response) > 100 else ''}'")
-    return response or "No response generated"
+def _aggregate(answers: List[str]) -> str:
+    """Majority vote over per-window answers (case/punctuation-insensitive)."""
+    def norm(a: str) -> str:
+        return re.sub(r"[^\w\s]", "", a.lower()).strip()
+
+    votes = Counter(norm(a) for a in answers)
+    best = max(votes.values())
+    # earliest window wins ties
+    return next(a for a in answers if votes[norm(a)] == best)
+
+
+def analyse_windows(
+    wav_path: Path,
+    processor,
+    model,
+    window_seconds: float = 30.0,
+    hop_seconds: float = 25.0,
+    batch_size: int = 1,
+) -> str:
+    """Score every overlapping window of a long clip and aggregate the answers."""
+    target_sr = processor.feature_extractor.sampling_rate
+    answers: List[str] = []
+    pending = []
+    # windows are streamed, so at most `batch_size` of them are in memory
+    for start, window in iter_windows(wav_path, target_sr, window_seconds, hop_seconds):
+        print(f"   🪟 window @ {start:.0f}s")
+        pending.append(window)
+        if len(pending) == batch_size:
+            answers += generate_answers(pending, processor, model)
+            pending = []
+    if pending:
+        answers += generate_answers(pending, processor, model)
+
+    if not answers:
+        return "No response generated"
+    return _aggregate(answers)
+
+
+def analyse_clip(wav_path: Path, processor, model) -> str:
+    """Run a single WAV through the model and return its answer."""
+    return analyse_batch([wav_path], processor, model)[0]
+
+
+def analyse_batch_remote(wav_paths: List[Path], server: str) -> List[str]:
+    """Send clips to a running qwen_server concurrently so it can micro-batch them."""
+    from qwen_server import analyse_remote
+
+    with ThreadPoolExecutor(max_workers=len(wav_paths)) as pool:
+        return list(pool.map(
+            lambda p: analyse_remote(server, {"path": str(p.resolve()), "gen_kwargs": GEN_KWARGS}),
+            wav_paths))
+
+
+def _length_sorted_batches(items: List[tuple], batch_size: int) -> List[List[tuple]]:
+    """Group clips (tuples starting with the WAV path) of similar duration so
+    padding inside a batch stays small."""
+    batches, stats = length_batches(items, batch_size, key=lambda it: duration(it[0]), cap=30)
+    print(f"   📏 padding {stats['padding_ratio']:.1%} "
+          f"(unsorted {stats['padding_ratio_unsorted']:.1%})")
+    return batches
 
 
 def traverse_and_analyse(
@@ -95,39 +277,166 @@ def traverse_and_analyse(
     out_path: Path,
     processor,
     model,
+    batch_size: int = 1,
+    window_seconds: Optional[float] = None,
+    hop_seconds: float = 25.0,
+    server: Optional[str] = None,
+    model_name: str = DEFAULT_MODEL,
+    precision: Optional[str] = None,
+    dry_run: bool = False,
+    dedupe: bool = False,
 ) -> Dict[str, str]:
-    """Walk the directory tree, run every WAV, and dump incremental JSON."""
+    """
+    Walk the directory tree, run every WAV, and append each answer to
+    <output>.jsonl as it arrives; <output> is exported from it at the end.
+
+    Clips are skipped when the result cache already holds an answer for the
+    same audio bytes, question, model, precision and generation settings
+    (with `server`, those of the server, see qwen_server.check_server), or
+    when the existing results already hold a non-error answer for them. With
+    dedupe=True a clip that acoustically duplicates another one (see
+    fingerprint.py) is not run and takes that clip's answer. With
+    dry_run=True only the pending clips are listed; no results, caches or
+    indexes are written (the databases are opened read-only).
+    """
+    jsonl_path = out_path.with_suffix(".jsonl")
     results: Dict[str, str] = {}
-
-    if out_path.exists():
-        try:
-            with out_path.open() as f:
-                results = json.load(f)
-            print(f" Loaded {len(results)} existing results from {out_path}")
-        except Exception as e:
-            print(f"Could not read existing results: {e}")
+    try:
+        if not dry_run:
+            seed_from_json(jsonl_path, out_path)
+        elif not jsonl_path.exists() and out_path.exists():
+            results = json.loads(out_path.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"Could not read existing results: {e}")
+    records = load_records(jsonl_path)
+    results.update((p, r["result"]) for p, r in records.items())
+    # answers copied from a duplicate by --dedupe only count on --dedupe runs
+    copied = {p for p, r in records.items() if "duplicate_of" in r}
+    if results:
+        print(f" Loaded {len(results)} existing results from "
+              f"{jsonl_path if jsonl_path.exists() else out_path}")
 
     wav_paths = sorted(root_dir.rglob("*.wav"))
     print(f"🔍 Found {len(wav_paths)} .wav files under {root_dir}")
 
-    for idx, wav_path in enumerate(wav_paths, 1):
+    cache = ResultCache(readonly=dry_run)
+    params = dict(GEN_KWARGS, precision=precision)
+    if window_seconds is not None:
+        params.update(window_seconds=window_seconds, hop_seconds=hop_seconds)
+    else:
+        params.update(max_seconds=30)
+
+    pending, hits, meta_of = [], [], {}
+    for wav_path in wav_paths:
         rel_path = wav_path.relative_to(root_dir).as_posix()
+        key, meta = cache.entry_for_file(wav_path, QUESTION, model_name, params)
+        meta_of[key] = meta
+        cached = cache.get(key)
+        if cached is None:
+            prior = results.get(rel_path)
+            if prior and not prior.startswith("ERROR:") and (dedupe or rel_path not in copied):
+                continue        # answered by a run from before the result cache
+            pending.append((wav_path, rel_path, key))
+        elif results.get(rel_path) != cached:
+            hits.append((rel_path, cached))
+    dupes = {}
+    if dedupe and pending:
+        pending, dupes = _drop_duplicates(wav_paths, pending, root_dir, readonly=dry_run)
+    print(f"⏭️  {len(wav_paths) - len(pending) - len(dupes)} already answered, "
+          f"{len(dupes)} duplicates, {len(pending)} to go")
+    if dry_run:
+        audio_s = sum(min(duration(p), 30) for p, _, _ in pending)
+        print(f"   {audio_s:.0f} audio-seconds pending")
+        for _, rel_path, _ in pending:
+            print(f"  • {rel_path}")
+        return results
+
+    sink = ResultSink(jsonl_path)
+    for rel_path, cached in hits:
+        results[rel_path] = cached
+        sink.write(rel_path, cached)
+
+    def record(rel_path: str, key: str, guess: str):
+        results[rel_path] = guess
+        sink.write(rel_path, guess)
+        if not guess.startswith("ERROR:"):
+            cache.put(key, guess, **meta_of[key])
+
+    try:
+        _run_pending(pending, record, processor, model, batch_size,
+                     window_seconds, hop_seconds, server)
+        # reused answers go to the results only: the cache is keyed by audio and
+        # must hold real inferences, not a fingerprint match's copy
+        for (_, rel_path, _), canon_rel in dupes.items():
+            if canon_rel in results:
+                results[rel_path] = results[canon_rel]
+                sink.write(rel_path, results[canon_rel], duplicate_of=canon_rel)
+    finally:
+        sink.close()
+        export_json(jsonl_path, out_path)
 
-        if rel_path in results:
-            print(f"[{idx}/{len(wav_paths)}] ⏭️  {rel_path} (already done)")
-            continue
+    return results
 
-        print(f"[{idx}/{len(wav_paths)}] 🎧  {rel_path}")
+
+def _drop_duplicates(wav_paths, pending, root_dir, readonly=False):
+    """
+    Split `pending` into clips to run and {item: canonical rel_path} for
+    acoustic duplicates. Clips that already have an answer are preferred as
+    the canonical copy.
+    """
+    from fingerprint import FingerprintIndex
+
+    todo = {p for p, _, _ in pending}
+    ordered = [p for p in wav_paths if p not in todo] + [p for p, _, _ in pending]
+    with span("dedupe"):
+        canon = FingerprintIndex(readonly=readonly).duplicates(ordered)
+    keep, dupes = [], {}
+    for item in pending:
+        if item[0] in canon:
+            dupes[item] = canon[item[0]].relative_to(root_dir).as_posix()
+        else:
+            keep.append(item)
+    return keep, dupes
+
+
+def _run_pending(pending, record, processor, model, batch_size,
+                 window_seconds, hop_seconds, server):
+    """Run (wav_path, rel_path, key) items and hand every answer to `record`."""
+    if batch_size > 1 and window_seconds is None:
+        batches = _length_sorted_batches(pending, batch_size)
+        for idx, batch in enumerate(batches, 1):
+            batch_paths = [p for p, _, _ in batch]
+            print(f"[{idx}/{len(batches)}] 🎧  {', '.join(rel for _, rel, _ in batch)}")
+            try:
+                with span("batch", size=len(batch)):
+                    if server:
+                        guesses = analyse_batch_remote(batch_paths, server)
+                    else:
+                        guesses = analyse_batch(batch_paths, processor, model)
+            except Exception as exc:
+                print(f" Error on batch {idx}: {exc}")
+                guesses = [f"ERROR: {exc}"] * len(batch)
+
+            for (_, rel_path, key), guess in zip(batch, guesses):
+                record(rel_path, key, guess)
+        return
+
+    for idx, (wav_path, rel_path, key) in enumerate(pending, 1):
+        print(f"[{idx}/{len(pending)}] 🎧  {rel_path}")
         try:
-            guess = analyse_clip(wav_path, processor, model)
+            with span("clip", path=rel_path):
+                if server:
+                    guess = analyse_batch_remote([wav_path], server)[0]
+                elif window_seconds is not None:
+                    guess = analyse_windows(wav_path, processor, model,
+                                            window_seconds, hop_seconds, batch_size)
+                else:
+                    guess = analyse_clip(wav_path, processor, model)
         except Exception as exc:
             print(f" Error on '{rel_path}': {exc}")
             guess = f"ERROR: {exc}"
 
-        results[rel_path] = guess
-        out_path.write_text(json.dumps(results, indent=2, ensure_ascii=False))
-
-    return results
+        record(rel_path, key, guess)
 
 
 # ─────────────── CLI ─────────────── #
@@ -141,20 +450,85 @@ def parse_args():
                    help=f"JSON results file (default: {DEFAULT_OUTPUT_FILE})")
     p.add_argument("--model_name", default=DEFAULT_MODEL,
                    help="HF model name or local checkpoint")
-    return p.parse_args()
+    p.add_argument("--batch_size", type=int, default=1,
+                   help="clips per generate call, grouped by length (default: 1)")
+    p.add_argument("--window_seconds", type=float, default=None,
+                   help="score the whole clip in overlapping windows of this length "
+                        "instead of only its first 30 s")
+    p.add_argument("--hop_seconds", type=float, default=25.0,
+                   help="step between windows (default: 25)")
+    p.add_argument("--precision", choices=PRECISIONS, default=None,
+                   help="weights precision; int8 = dynamic quantization of Linear "
+                        "layers on CPU (default: fp16 on MPS, fp32 otherwise)")
+    p.add_argument("--threads", type=int, default=None,
+                   help="torch intra-op threads (CPU)")
+    p.add_argument("--interop_threads", type=int, default=None,
+                   help="torch inter-op threads (CPU)")
+    p.add_argument("--prefix_cache", action="store_true",
+                   help="reuse the KV states of the prompt text before the audio "
+                        "across clips (batch_size 1 only)")
+    p.add_argument("--trace", type=Path, default=None,
+                   help="write a Chrome trace + per-stage summary here")
+    p.add_argument("--profile", action="store_true",
+                   help="also record cProfile stats next to --trace")
+    p.add_argument("--server", default=None,
+                   help="URL of a running qwen_server.py; skips loading the model here")
+    p.add_argument("--dry_run", action="store_true",
+                   help="only list the clips that would be run; loads no model")
+    p.add_argument("--dedupe", action="store_true",
+                   help="run acoustically duplicate clips once (see fingerprint.py)")
+    args = p.parse_args()
+    if args.window_seconds is not None and not 0 < args.hop_seconds <= args.window_seconds:
+        p.error("--hop_seconds must be > 0 and <= --window_seconds")
+    return args
 
 
 def main():
     args = parse_args()
     args.output_file.parent.mkdir(parents=True, exist_ok=True)
+    if args.trace:
+        telemetry.enable(args.trace, profile=args.profile)
+
+    precision = args.precision
+    if args.server:
+        from qwen_server import check_server
 
-    processor, model = load_model(args.model_name)
+        if args.window_seconds is not None:
+            raise SystemExit("--window_seconds needs a local model (drop --server)")
+        # answers are cached under the server's model and precision, not the local flags
+        try:
+            precision = check_server(args.server, args.model_name).get("precision")
+        except OSError as exc:
+            if not args.dry_run:
+                raise SystemExit(f"{args.server} unreachable: {exc}")
+            print(f"⚠️ {args.server} unreachable ({exc}); planning with local --precision")
+
+    if args.server or args.dry_run:
+        processor = model = None
+    else:
+        with span("load_model"):
+            processor, model = load_model(
+                args.model_name, args.precision, args.threads, args.interop_threads,
+                prefix_cache=args.prefix_cache,
+            )
     traverse_and_analyse(
         args.input_dir.expanduser(),
         args.output_file,
         processor,
         model,
+        batch_size=args.batch_size,
+        window_seconds=args.window_seconds,
+        hop_seconds=args.hop_seconds,
+        server=args.server,
+        model_name=args.model_name,
+        precision=precision,
+        dry_run=args.dry_run,
+        dedupe=args.dedupe,
     )
+    if args.dry_run:
+        return
+    if getattr(model, "prefix_cache", None) is not None:
+        print(f"   ♻️ {model.prefix_cache.report()}")
     print(f"\n  All done. Results saved to {args.output_file}")
 
 
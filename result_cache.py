@@ -0,0 +1,117 @@
+"""
+Content-addressed cache of model / API answers (SQLite).
+
+An answer is stored under sha256 of
+    (audio bytes hash, noise config, prompt text, model name, sampling params)
+so re-running a sweep only pays for (clip, config) pairs that are new. A
+replaced WAV or an edited prompt is a different key, unlike skipping by
+relative path.
+
+    cache = ResultCache()
+    key, meta = cache.entry(file_hash(wav), prompt=PROMPT, model=MODEL,
+                            params={"temperature": 0.7},
+                            noise={"noise": "whitenoise.wav", "snr_db": 20})
+    answer = cache.get(key)
+    if answer is None:
+        answer = run_model(...)
+        cache.put(key, answer, **meta)     # also records audio_hash, model, config
+
+`ResultCache(readonly=True)` is for --dry_run planning: it opens an existing
+database read-only and treats a missing one as empty, creating nothing.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from audio_cache import file_hash
+
+CACHE_PATH = "results_cache.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key        TEXT PRIMARY KEY,
+    audio_hash TEXT,
+    model      TEXT,
+    config     TEXT,
+    answer     TEXT,
+    created    REAL
+)
+"""
+
+
+def readonly_uri(path) -> str:
+    """
+    SQLite URI that opens `path` without writing anything next to it.
+    immutable=1 creates no -wal/-shm files but ignores a -wal file, so it
+    is only used when there is none (no writer has pages left there).
+    """
+    path = os.path.abspath(path)
+    return f"file:{path}?{'mode=ro' if os.path.exists(path + '-wal') else 'immutable=1'}"
+
+
+class ResultCache:
+    def __init__(self, path=CACHE_PATH, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        if readonly:
+            self._conn = (sqlite3.connect(readonly_uri(path), uri=True,
+                                          timeout=30, check_same_thread=False)
+                          if os.path.exists(path) else None)
+        else:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def config(prompt, model, params=None, noise=None) -> dict:
+        return {"prompt": prompt, "model": model, "params": params or {}, "noise": noise}
+
+    def key(self, audio_hash, prompt, model, params=None, noise=None) -> str:
+        blob = json.dumps({"audio": audio_hash, **self.config(prompt, model, params, noise)},
+                          sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def key_for_file(self, path, prompt, model, params=None, noise=None) -> str:
+        return self.key(file_hash(path), prompt, model, params, noise)
+
+    def entry(self, audio_hash, prompt, model, params=None, noise=None):
+        """(key, put() keyword arguments describing it)."""
+        meta = {"audio_hash": audio_hash, "model": model,
+                "config": self.config(prompt, model, params, noise)}
+        return self.key(audio_hash, prompt, model, params, noise), meta
+
+    def entry_for_file(self, path, prompt, model, params=None, noise=None):
+        return self.entry(file_hash(path), prompt, model, params, noise)
+
+    def get(self, key):
+        if self._conn is None:
+            self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, answer, audio_hash=None, model=None, config=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, audio_hash, model,
+                 json.dumps(config, sort_keys=True, ensure_ascii=False) if config else None,
+                 answer, time.time()))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
@@ -0,0 +1,151 @@
+"""
+Crash-safe, append-only result log.
+
+Each result is one JSON line, `{"path": "<actor>/<file>.wav", "result": "..."}`,
+appended with a single O_APPEND write, so a crash can at worst leave one
+truncated final line (ignored on read) instead of a corrupt results file.
+fsync is batched: every `fsync_every` records or `fsync_interval` seconds,
+and on close.
+
+`export_json` compacts the log (last record per path wins, rewritten in
+place so re-runs don't grow it) and writes it back into the JSON files
+the rest of the repo uses: flat `{path: result}` like qwen_test.json, or
+nested `{actor: {file: result}}` like gpt4o_audio_results_by_actor.json.
+
+    with ResultSink("results.jsonl") as sink:
+        sink.write("robertpattinson/7_0.wav", answer)
+    export_json("results.jsonl", "results.json", nested=True)
+"""
+
+import json
+import os
+import pathlib
+import tempfile
+import time
+
+
+class ResultSink:
+    def __init__(self, path, fsync_every=16, fsync_interval=5.0):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._repair_tail()
+
+    def _repair_tail(self):
+        # a crash mid-line leaves no trailing newline; start the next record cleanly
+        size = os.fstat(self._fd).st_size
+        if size:
+            with open(self.path, "rb") as fh:
+                fh.seek(size - 1)
+                if fh.read(1) != b"\n":
+                    os.write(self._fd, b"\n")
+
+    def write(self, path: str, result, **extra):
+        record = {"path": path, "result": result, **extra}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        os.write(self._fd, line)
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.flush()
+
+    def flush(self):
+        if self._unsynced:
+            os.fsync(self._fd)
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._fd is not None:
+            self.flush()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_records(path) -> dict:
+    """{path: record} from a sink file, extra fields included; later records win."""
+    records = {}
+    path = pathlib.Path(path)
+    if not path.exists():
+        return records
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+                if "result" in record:
+                    records[record["path"]] = record
+            except (ValueError, KeyError, TypeError):
+                continue
+    return records
+
+
+def load(path) -> dict:
+    """{path: result} from a sink file; later records win, broken lines are skipped."""
+    return {p: record["result"] for p, record in load_records(path).items()}
+
+
+def nest(results: dict) -> dict:
+    """{"actor/file.wav": r} → {"actor": {"file.wav": r}}."""
+    nested = {}
+    for path, result in results.items():
+        group, _, name = path.rpartition("/")
+        nested.setdefault(group, {})[name] = result
+    return nested
+
+
+def _atomic_write(path: pathlib.Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        pathlib.Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def compact(path) -> dict:
+    """Rewrite the log with one record per path (atomic replace); returns {path: result}."""
+    path = pathlib.Path(path)
+    records = load_records(path)
+    if path.exists():
+        _atomic_write(path, "".join(json.dumps(r, ensure_ascii=False) + "\n"
+                                    for r in records.values()))
+    return {p: r["result"] for p, r in records.items()}
+
+
+def export_json(jsonl_path, json_path, nested=False) -> dict:
+    """Compact the log and write its results as (flat or per-actor nested) pretty JSON."""
+    results = compact(jsonl_path)
+    data = nest(results) if nested else results
+    _atomic_write(pathlib.Path(json_path), json.dumps(data, indent=2, ensure_ascii=False))
+    return data
+
+
+def seed_from_json(jsonl_path, json_path):
+    """One-off import of an existing results JSON (flat or nested) into a sink file."""
+    json_path = pathlib.Path(json_path)
+    if pathlib.Path(jsonl_path).exists() or not json_path.exists():
+        return
+    with open(json_path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    with ResultSink(jsonl_path) as sink:
+        for key, value in data.items():
+            if isinstance(value, dict):
+                for name, result in value.items():
+                    sink.write(f"{key}/{name}", result)
+            else:
+                sink.write(key, value)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Duration-aware scheduling for inference over clips of mixed length.
+
+Durations come from the WAV header (nothing is decoded), and from
+data.csv / mixedDuration.csv only when the file is missing or unreadable;
+the CSV is off by seconds for several clips. With them we
+
+  • bucket clips into batches of similar length, so a padded batch does not
+    wait on one long clip (`length_batches`, reports the padding ratio), and
+  • spread clips over N workers by total audio-seconds with longest-first
+    greedy assignment (`balance`, reports the makespan).
+
+USAGE
+    python scheduler.py Mixed_Durations --batch_size 4 --workers 3
+"""
+
+import argparse
+import csv
+import heapq
+import pathlib
+import wave
+
+ROOT = pathlib.Path(__file__).resolve().parent
+CSV_SOURCES = {
+    # wav folder: metadata csv (ids map to NN.wav)
+    ROOT / "Lines": ROOT / "data.csv",
+    ROOT / "Mixed_Durations": ROOT / "mixedDuration.csv",
+}
+
+_csv_durations = None
+
+
+def _load_csv_durations() -> dict:
+    durations = {}
+    for wav_dir, csv_path in CSV_SOURCES.items():
+        if not csv_path.exists():
+            continue
+        with open(csv_path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                try:
+                    idx, dur = int(row["id"]), float(row["Duration"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                durations[(wav_dir / f"{idx:02d}.wav").resolve()] = dur
+    return durations
+
+
+def header_duration(path) -> float:
+    try:
+        with wave.open(str(path)) as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError, OSError):
+        return 0.0
+
+
+def duration(path) -> float:
+    """Clip length in seconds: exact WAV header first, metadata CSV as fallback."""
+    global _csv_durations
+    dur = header_duration(path)
+    if dur:
+        return dur
+    if _csv_durations is None:
+        _csv_durations = _load_csv_durations()
+    return _csv_durations.get(pathlib.Path(path).resolve(), 0.0)
+
+
+def padding_ratio(batches, lengths) -> float:
+    """Share of padded (wasted) samples when each batch is padded to its longest clip."""
+    padded = real = 0.0
+    for batch in batches:
+        lens = [lengths[i] for i in batch]
+        if lens:
+            padded += max(lens) * len(lens)
+            real += sum(lens)
+    return 1 - real / padded if padded else 0.0
+
+
+def length_batches(items, batch_size, key=duration, cap=None):
+    """
+    Sort `items` by length and cut them into batches of `batch_size`.
+    `cap` clips the length used for sorting (e.g. the 30 s model cap).
+    Returns (batches of items, stats).
+    """
+    lengths = [min(key(x), cap) if cap else key(x) for x in items]
+    order = sorted(range(len(items)), key=lengths.__getitem__)
+    bucketed = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    naive = [list(range(i, min(i + batch_size, len(items))))
+             for i in range(0, len(items), batch_size)]
+    stats = {
+        "padding_ratio": round(padding_ratio(bucketed, lengths), 4),
+        "padding_ratio_unsorted": round(padding_ratio(naive, lengths), 4),
+    }
+    return [[items[i] for i in b] for b in bucketed], stats
+
+
+def balance(items, workers, key=duration):
+    """
+    Longest-processing-time-first assignment of items to `workers` queues,
+    balancing total audio-seconds. Returns (queues, stats).
+    """
+    lengths = [key(x) for x in items]
+    heap = [(0.0, w) for w in range(workers)]
+    queues = [[] for _ in range(workers)]
+    for i in sorted(range(len(items)), key=lengths.__getitem__, reverse=True):
+        load, w = heapq.heappop(heap)
+        queues[w].append(items[i])
+        heapq.heappush(heap, (load + lengths[i], w))
+
+    round_robin = [0.0] * workers
+    for i, length in enumerate(lengths):
+        round_robin[i % workers] += length
+    loads = sorted(load for load, _ in heap)
+    stats = {
+        "makespan_s": round(loads[-1], 2) if loads else 0.0,
+        "makespan_round_robin_s": round(max(round_robin), 2) if items else 0.0,
+        "ideal_s": round(sum(lengths) / workers, 2) if workers else 0.0,
+    }
+    return queues, stats
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Show duration-aware batches / worker plans.")
+    p.add_argument("dirs", nargs="+", type=pathlib.Path)
+    p.add_argument("--batch_size", type=int, default=4)
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--cap", type=float, default=30.0, help="model audio cap in seconds")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    clips = sorted(p for d in args.dirs for p in d.rglob("*.wav"))
+    _, batch_stats = length_batches(clips, args.batch_size, cap=args.cap)
+    _, worker_stats = balance(clips, args.workers)
+    print(f"{len(clips)} clips, {sum(map(duration, clips)):.1f} audio-seconds")
+    print(f"batch_size={args.batch_size}: padding {batch_stats['padding_ratio']:.1%} "
+          f"(unsorted {batch_stats['padding_ratio_unsorted']:.1%})")
+    print(f"workers={args.workers}: makespan {worker_stats['makespan_s']}s "
+          f"(round robin {worker_stats['makespan_round_robin_s']}s, "
+          f"ideal {worker_stats['ideal_s']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
 Clip.Cafe batch scraper–downloader
 
 Libraries:
-  pip install selenium webdriver-manager beautifulsoup4 pandas bs4
+  pip install selenium webdriver-manager selectolax   # or lxml / beautifulsoup4, see clip_meta.py
 
 USAGE
 • One URL:
@@ -12,31 +12,46 @@ USAGE
       python script.py <url1> <url2> <url3>
 • Text file (one URL per line):
       python script.py links.txt
+• N browsers in parallel:
+      python script.py --workers 4 links.txt
+• Plain HTTP with the saved cookies (browser only as a fallback):
+      python script.py --http --workers 4 links.txt
+• Only list what would be fetched (no browser, no network):
+      python script.py --dry_run links.txt
+• Against the mock server in http_download.py:
+      python script.py --base_url http://127.0.0.1:8766 https://clip.cafe/cast_bar/
 
 Outputs
 • data.csv         – grows with every clip (safe quoting)
 • Lines/NN.wav     – WAVs named after their id (01.wav, 02.wav, …)
+• clips.sqlite     – id allocator / clip index (rebuilt from the two above if deleted)
+• $TRACE_FILE      – per-stage timing trace (only when TRACE_FILE is set, see telemetry.py)
 """
 
-import os, re, sys, csv, time, pickle, tempfile, shutil, pathlib
-import pandas as pd
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+import os, sys, csv, time, pickle, tempfile, shutil, pathlib, queue, threading, hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from clip_manifest import ClipManifest, clip_count
+from clip_meta import extract_meta
+from http_download import Download
+from telemetry import count, span, timed
 
 # ─── paths & settings ───────────────────────────────────────────
 CSV_PATH        = "data.csv"
+MANIFEST_PATH   = "clips.sqlite"  # id allocator + clip index, see clip_manifest.py
 DL_DIR          = pathlib.Path("Lines")
 COOKIES_FILE    = "clipcafe_cookies.pkl"
 WAIT_SECS       = 15          # generic Selenium wait
 LOGIN_WAIT_SECS = 60          # first-run login grace period
+POLL_SECS       = 0.1         # download re-check interval (inotify wakes us sooner)
 
 # ─── browser helpers ───────────────────────────────────────────
 def start_browser():
+    # Selenium is only imported once a browser is actually needed
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
     opts = webdriver.ChromeOptions()
     opts.add_argument("--start-maximized")
     # temp dir so we can detect the new WAV reliably
@@ -64,57 +79,14 @@ def save_cookies(driver):
         pickle.dump(driver.get_cookies(), fh)
 
 # ─── CSV helpers ────────────────────────────────────────────────
-def _safe_max_id_from_csv(path: str) -> int | None:
-    """Read only the id column, skipping malformed lines. Return max id or None."""
-    try:
-        df = pd.read_csv(
-            path,
-            engine="python",         # needed for on_bad_lines="skip"
-            on_bad_lines="skip",
-            usecols=["id"],
-            dtype={"id": "Int64"},
-        )
-        if df.empty or df["id"].dropna().empty:
-            return None
-        return int(df["id"].dropna().astype(int).max())
-    except Exception:
-        # csv fallback parser (skip bad rows silently)
-        try:
-            max_id = None
-            with open(path, newline="", encoding="utf-8") as f:
-                for row in csv.DictReader(f):
-                    try:
-                        val = int(row.get("id", "").strip())
-                        max_id = val if (max_id is None or val > max_id) else max_id
-                    except Exception:
-                        continue
-            return max_id
-        except Exception:
-            return None
-
-def _safe_max_id_from_files(folder: pathlib.Path) -> int | None:
-    """Look for Lines/NN.wav and return max NN or None."""
-    if not folder.exists():
-        return None
-    nums = []
-    for p in folder.glob("*.wav"):
-        try:
-            nums.append(int(p.stem))
-        except Exception:
-            continue
-    return max(nums) if nums else None
-
-def next_id() -> int:
-    """Robust next id from CSV first, then from existing WAV filenames, else 1."""
-    if not os.path.exists(CSV_PATH):
-        file_max = _safe_max_id_from_files(DL_DIR)
-        return (file_max + 1) if file_max is not None else 1
+_manifest = None
 
-    csv_max = _safe_max_id_from_csv(CSV_PATH)
-    file_max = _safe_max_id_from_files(DL_DIR)
-
-    candidates = [x for x in [csv_max, file_max] if x is not None]
-    return (max(candidates) + 1) if candidates else 1
+def manifest() -> ClipManifest:
+    """Shared clip manifest; rebuilt from data.csv + Lines/ if clips.sqlite is gone."""
+    global _manifest
+    if _manifest is None:
+        _manifest = ClipManifest(MANIFEST_PATH, CSV_PATH, DL_DIR)
+    return _manifest
 
 def append_csv(row: dict):
     header = ["id", "Actor Name", "Movie Name", "Line", "Duration"]
@@ -131,89 +103,130 @@ def append_csv(row: dict):
         w.writerow(row)
 
 # ─── scraping helpers ──────────────────────────────────────────
-def extract_meta(html: str):
+def _sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _dir_watcher(folder: pathlib.Path):
     """
-    Return (actor, movie, cleaned_line, duration), handling pages that
-    lack the grey “Character by Actor” bar or any actor link at all.
+    Return (wait(timeout), close). wait blocks until something changes in
+    `folder` or the timeout passes; uses inotify when inotify_simple is
+    installed, otherwise it just sleeps (polling fallback).
     """
-    soup = BeautifulSoup(html, "html.parser")
+    try:
+        from inotify_simple import INotify, flags
+        ino = INotify()
+        ino.add_watch(str(folder), flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE
+                      | flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM)
+    except Exception:
+        return time.sleep, (lambda: None)
+    return (lambda timeout: ino.read(timeout=int(timeout * 1000))), ino.close
 
-    cast = soup.select_one("div.movieCastActor")
-    if cast and cast.select_one("a[href*='actor/']"):
-        char  = cast.select_one("b").get_text(strip=True)
-        actor = cast.select_one("a[href*='actor/']").get_text(strip=True)
-    else:
-        a_tag = soup.select_one("a[href*='actor/']")
-        actor = a_tag.get_text(strip=True) if a_tag else "Unknown"
-        char_tag = soup.select_one("div.highlight-box b")
-        char  = char_tag.get_text(strip=True) if char_tag else ""
-
-    movie = soup.select_one("a.white.pl-10").get_text(strip=True)
-
-    quote_box = soup.select_one("div.highlight-box")
-    quote_txt = quote_box.get_text(" ", strip=True)
-    line = (re.sub(rf"^{re.escape(char)}\s*:\s*", "", quote_txt, flags=re.I)
-            if char else quote_txt)
-
-    m = re.search(r"(\d{1,3}(?:\.\d+)?)\s*secs?", html, re.I)
-    duration = float(m.group(1)) if m else 0.0
-    return actor, movie, line, duration
-
-def wait_download(tmp_dir: pathlib.Path, before):
-    deadline = time.time() + WAIT_SECS
-    while time.time() < deadline:
-        # ignore partial Chrome files (.crdownload)
-        files = [f for f in tmp_dir.glob("*.wav")]
-        new   = [f for f in files if f not in before]
-        if new:
-            return new[0]
-        time.sleep(1)
+def _finished_wav(tmp_dir: pathlib.Path, before, sizes: dict):
+    """A new .wav whose .crdownload is gone and whose size stopped changing."""
+    if any(tmp_dir.glob("*.crdownload")):
+        return None
+    for f in tmp_dir.glob("*.wav"):
+        if f in before:
+            continue
+        try:
+            size = f.stat().st_size
+        except FileNotFoundError:
+            continue
+        stable = size > 0 and sizes.get(f) == size
+        sizes[f] = size
+        if stable:
+            return f
+    return None
+
+def wait_download(tmp_dir: pathlib.Path, before) -> Download:
+    deadline = time.monotonic() + WAIT_SECS
+    wait, close = _dir_watcher(tmp_dir)
+    sizes = {}
+    try:
+        while (left := deadline - time.monotonic()) > 0:
+            # ignore partial Chrome files (.crdownload)
+            wav = _finished_wav(tmp_dir, before, sizes)
+            if wav:
+                return Download(wav, sizes[wav], _sha256(wav))
+            wait(min(POLL_SECS, left))
+    finally:
+        close()
     raise RuntimeError("Download timed out")
 
 # ─── process one clip (driver already running) ─────────────────
-def handle_clip(drv, url):
-    drv.get(url)
-    WebDriverWait(drv, WAIT_SECS).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "div.highlight-box")))
+def scrape_clip(drv, url):
+    """Open the clip page, trigger the WAV download; return (meta, Download)."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
-    actor, movie, line, dur = extract_meta(drv.page_source)
+    with span("page_load", url=url):
+        drv.get(url)
+        WebDriverWait(drv, WAIT_SECS).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.highlight-box")))
+
+    with span("extract_meta"):
+        meta = extract_meta(drv.page_source)
 
     # snapshot BEFORE clicking to avoid race with fast downloads
     before = set(drv.tmp_download_dir.glob("*.wav"))
 
-    # overlay-proof click on “Download Clip”
-    drv.execute_script("document.querySelectorAll('.fixedBanner').forEach(el=>el.remove())")
-    btn = WebDriverWait(drv, WAIT_SECS).until(
-        EC.element_to_be_clickable((By.CSS_SELECTOR, "button[aria-label='Download Clip']")))
-    drv.execute_script("arguments[0].scrollIntoView({block:'center'});", btn)
-    drv.execute_script("arguments[0].click();", btn)
-
-    WebDriverWait(drv, WAIT_SECS).until(
-        EC.element_to_be_clickable((By.CSS_SELECTOR, "input#audio-wav"))).click()
-    drv.find_element(By.CSS_SELECTOR, "button.orangeButton[type='submit']").click()
-
-    wav = wait_download(drv.tmp_download_dir, before)
-
-    idx = next_id()
-    DL_DIR.mkdir(exist_ok=True)
-    shutil.move(str(wav), DL_DIR / f"{idx:02d}.wav")
-
-    append_csv({"id": idx, "Actor Name": actor, "Movie Name": movie,
-                "Line": line, "Duration": dur})
-    print(f"✔ {idx:02d}  {actor} — “{movie}”")
+    with span("download_click"):
+        # overlay-proof click on “Download Clip”
+        drv.execute_script("document.querySelectorAll('.fixedBanner').forEach(el=>el.remove())")
+        btn = WebDriverWait(drv, WAIT_SECS).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "button[aria-label='Download Clip']")))
+        drv.execute_script("arguments[0].scrollIntoView({block:'center'});", btn)
+        drv.execute_script("arguments[0].click();", btn)
+
+        WebDriverWait(drv, WAIT_SECS).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "input#audio-wav"))).click()
+        drv.find_element(By.CSS_SELECTOR, "button.orangeButton[type='submit']").click()
+
+    with span("download_wait"):
+        dl = wait_download(drv.tmp_download_dir, before)
+    count("bytes_downloaded", dl.size)
+    return meta, dl
+
+def store_clip(meta, dl: Download) -> dict:
+    """Give the clip the next id, move its WAV to Lines/NN.wav; return its CSV row."""
+    actor, movie, line, dur = meta
+    with span("store"):
+        idx = manifest().add(actor, movie, line, dur)
+        DL_DIR.mkdir(exist_ok=True)
+        shutil.move(str(dl.path), DL_DIR / f"{idx:02d}.wav")
+    return {"id": idx, "Actor Name": actor, "Movie Name": movie,
+            "Line": line, "Duration": dur}
+
+def write_row(row: dict):
+    with span("csv_append"):
+        append_csv(row)
+    count("clips")
+    print(f"✔ {row['id']:02d}  {row['Actor Name']} — “{row['Movie Name']}”")
+
+@timed()
+def handle_clip(drv, url):
+    write_row(store_clip(*scrape_clip(drv, url)))
 
 # ─── run a batch of links ──────────────────────────────────────
+def ensure_login(drv):
+    if not restore_cookies(drv):
+        print(f"First run – log in within {LOGIN_WAIT_SECS}s …")
+        drv.get("https://clip.cafe")
+        for s in range(LOGIN_WAIT_SECS, 0, -1):
+            print(f"\r   {s:02d}s left", end="", flush=True)
+            time.sleep(1)
+        print("\nCookies saved.")
+        save_cookies(drv)
+
 def run_batch(urls):
     drv = start_browser()
     try:
-        if not restore_cookies(drv):
-            print(f"First run – log in within {LOGIN_WAIT_SECS}s …")
-            drv.get("https://clip.cafe")
-            for s in range(LOGIN_WAIT_SECS, 0, -1):
-                print(f"\r   {s:02d}s left", end="", flush=True)
-                time.sleep(1)
-            print("\nCookies saved.")
-            save_cookies(drv)
+        ensure_login(drv)
 
         for u in urls:
             try:
@@ -225,6 +238,104 @@ def run_batch(urls):
         drv.quit()
         shutil.rmtree(drv.tmp_download_dir, ignore_errors=True)
 
+# ─── parallel workers ──────────────────────────────────────────
+def _csv_writer(rows: "queue.Queue[dict | None]"):
+    """Single consumer that owns data.csv; None stops it."""
+    while (row := rows.get()) is not None:
+        write_row(row)
+
+def _worker(urls: "queue.Queue[str]", rows: "queue.Queue[dict | None]"):
+    drv = start_browser()   # own Chrome, own temp download dir
+    try:
+        restore_cookies(drv)
+        while True:
+            try:
+                u = urls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                with span("handle_clip"):
+                    row = store_clip(*scrape_clip(drv, u))
+                rows.put(row)
+            except Exception as e:
+                print(f"error: {u}  ({e})")
+    finally:
+        drv.quit()
+        shutil.rmtree(drv.tmp_download_dir, ignore_errors=True)
+
+def login_once():
+    """Open a browser just for the first-run login if there are no saved cookies."""
+    if os.path.exists(COOKIES_FILE):
+        return
+    drv = start_browser()
+    try:
+        ensure_login(drv)
+    finally:
+        drv.quit()
+        shutil.rmtree(drv.tmp_download_dir, ignore_errors=True)
+
+def run_parallel(urls, workers):
+    """Same as run_batch, but spread the links over `workers` browsers."""
+    login_once()
+
+    DL_DIR.mkdir(exist_ok=True)
+    manifest()   # open/rebuild once before the workers race for ids
+    todo: "queue.Queue[str]" = queue.Queue()
+    for u in urls:
+        todo.put(u)
+    rows: "queue.Queue[dict | None]" = queue.Queue()
+
+    writer = threading.Thread(target=_csv_writer, args=(rows,))
+    writer.start()
+    threads = [threading.Thread(target=_worker, args=(todo, rows))
+               for _ in range(min(workers, len(urls)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    rows.put(None)
+    writer.join()
+
+# ─── direct HTTP mode ──────────────────────────────────────────
+def run_http(urls, workers=1, base_url=None):
+    """
+    Fetch pages and WAVs over one pooled HTTP session with the saved
+    cookies (see http_download.py); clips that need a real browser are
+    retried through the Selenium flow afterwards.
+    """
+    from http_download import ClipSession, NeedsBrowser
+
+    if not base_url:
+        login_once()
+    DL_DIR.mkdir(exist_ok=True)
+    manifest()
+    session = ClipSession(COOKIES_FILE, base_url=base_url, pool_size=max(workers, 1))
+    lock = threading.Lock()
+    fallback = []
+
+    def one(u):
+        try:
+            with span("handle_clip_http"):
+                row = store_clip(*session.scrape(u, DL_DIR))
+            with lock:
+                write_row(row)
+        except NeedsBrowser as e:
+            print(f"↪ {u}: {e} – retrying in the browser")
+            with lock:
+                fallback.append(u)
+        except Exception as e:
+            print(f"error: {u}  ({e})")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            list(pool.map(one, urls))
+    finally:
+        session.close()
+    if fallback and base_url:
+        print(f"{len(fallback)} clip(s) need the browser; not retried against {base_url}")
+    elif fallback:
+        (run_parallel if workers > 1 else run_batch)(fallback)
+
 # ─── utilities ─────────────────────────────────────────────────
 def collect_urls(args):
     if len(args) == 1 and os.path.isfile(args[0]):         # links.txt style
@@ -232,9 +343,41 @@ def collect_urls(args):
             return [ln.strip() for ln in fh if ln.strip()]
     return args
 
+def plan(urls, workers, http, base_url):
+    """Print what a run would do; opens no browser and makes no requests."""
+    mode = (f"http via {base_url}" if base_url else "http + browser fallback") if http else "browser"
+    print(f"{len(urls)} link(s) ({len(set(urls))} unique), mode: {mode}, workers: {workers}")
+    # read-only: a dry run must not create clips.sqlite
+    n = clip_count(MANIFEST_PATH)
+    have = (f"{n} clip(s) already in {MANIFEST_PATH}" if n is not None
+            else f"no {MANIFEST_PATH} yet (rebuilt from {CSV_PATH} on the first real run)")
+    print(f"{have}; "
+          f"cookies {'found' if os.path.exists(COOKIES_FILE) else 'missing → first-run login'}")
+    for u in urls:
+        print(f"  • {u}")
+
 # ─── main ─────────────────────────────────────────────────────
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage:\n  python script.py <URL …>\n  python script.py links.txt")
-        sys.exit(1)
-    run_batch(collect_urls(sys.argv[1:]))
+    args, workers, http, base_url, dry_run = sys.argv[1:], 1, False, None, False
+    while args[:1] in (["--workers"], ["--base_url"], ["--http"], ["--dry_run"]):
+        flag = args.pop(0)
+        if flag == "--http":
+            http = True
+        elif flag == "--dry_run":
+            dry_run = True
+        elif args and flag == "--workers":
+            workers = int(args.pop(0))
+        elif args and flag == "--base_url":
+            http, base_url = True, args.pop(0)
+    if not args or args[0] in ("-h", "--help"):
+        print("Usage:\n  python script.py [--workers N] [--http] [--base_url URL] [--dry_run] <URL …>\n"
+              "  python script.py [--workers N] [--http] [--base_url URL] [--dry_run] links.txt")
+        sys.exit(0 if args else 1)
+    if dry_run:
+        plan(collect_urls(args), workers, http, base_url)
+    elif http:
+        run_http(collect_urls(args), workers, base_url)
+    elif workers > 1:
+        run_parallel(collect_urls(args), workers)
+    else:
+        run_batch(collect_urls(args))
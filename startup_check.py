@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Startup-time regression check for the entry points.
+
+Imports each module in a fresh `python -X importtime` process and fails
+when it pulls in a heavy dependency at import time (torch, transformers,
+openai, selenium, …) or when its cumulative import time exceeds the
+budget. Models, clients and browsers are expected to be created on first
+use, so `--help`, `--dry_run` and importing a helper stay instant.
+
+USAGE
+    python startup_check.py                      # all entry points, 300 ms budget
+    python startup_check.py openai_test script --budget_ms 150
+"""
+
+import argparse
+import os
+import pathlib
+import re
+import subprocess
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent
+
+ENTRY_POINTS = [
+    "openai_test", "qwen_test", "qwen_test_Ata", "qwen_server", "script",
+    "evaluate", "kimi_runner", "augment", "scheduler", "clip_meta", "http_download",
+    "fingerprint", "speaker_id", "openai_stub", "dataset", "bench",
+]
+HEAVY = {
+    "torch", "transformers", "openai", "httpx", "requests", "selenium",
+    "webdriver_manager", "bs4", "lxml", "selectolax", "pandas", "pyarrow", "kimia_infer",
+}
+
+# "import time:       412 |       1739 |   numpy.core"
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module: str) -> dict:
+    """Top-level packages imported by `import module` and its cumulative time."""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    env.pop("TRACE_FILE", None)
+    env.pop("QWEN_SERVER", None)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    packages, total_us = set(), 0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        name = m.group(4)
+        packages.add(name.split(".")[0])
+        if name == module:
+            total_us = int(m.group(2))
+    error = None
+    if proc.returncode:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+    return {"packages": packages, "ms": total_us / 1000, "error": error}
+
+
+def check(modules, budget_ms) -> list:
+    """Return a list of problems (empty if every module passes)."""
+    problems = []
+    for module in modules:
+        prof = import_profile(module)
+        heavy = sorted(prof["packages"] & HEAVY)
+        status = "✅"
+        if prof["error"]:
+            status = "⚠️"
+            problems.append(f"{module}: {prof['error']}")
+        elif heavy:
+            status = "❌"
+            problems.append(f"{module}: imports {', '.join(heavy)} at import time")
+        elif prof["ms"] > budget_ms:
+            status = "❌"
+            problems.append(f"{module}: {prof['ms']:.0f} ms > {budget_ms} ms budget")
+        print(f"{status} {module:<15} {prof['ms']:>7.1f} ms"
+              f"{'  (' + prof['error'] + ')' if prof['error'] else ''}")
+    return problems
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Fail if entry points import heavy deps eagerly.")
+    p.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    p.add_argument("--budget_ms", type=float, default=300.0,
+                   help="max cumulative import time per module")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    problems = check(args.modules, args.budget_ms)
+    for problem in problems:
+        print(f"   {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
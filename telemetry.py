@@ -0,0 +1,163 @@
+"""
+Lightweight per-stage timing telemetry.
+
+Off by default; when disabled `span()` costs one attribute check. Turn it
+on with `telemetry.enable("trace.json")`, the `--trace` flag of the CLIs,
+or the TRACE_FILE environment variable. At exit it writes
+
+  • <trace>.json            Chrome trace-event JSON (chrome://tracing, Perfetto)
+  • <trace>.summary.json    per-span count / total / p50 / p95 / max and a
+                            log2-millisecond histogram, plus counters
+  • <trace>.prof            cProfile stats, only with TRACE_PROFILE=1 / profile=True
+
+    from telemetry import span, count, timed
+
+    with span("download_wait", url=url):
+        ...
+    @timed("extract_meta")
+    def extract_meta(html): ...
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import math
+import os
+import pathlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_state = {"enabled": False, "path": None, "profiler": None}
+_events = []
+_counters = defaultdict(int)
+_lock = threading.Lock()
+_t0 = time.perf_counter_ns()
+
+
+def enable(path, profile=False):
+    """Start recording; everything is written to `path` (and siblings) at exit."""
+    if _state["enabled"]:
+        return
+    _state.update(enabled=True, path=pathlib.Path(path))
+    if profile:
+        _state["profiler"] = cProfile.Profile()
+        _state["profiler"].enable()
+    atexit.register(dump)
+
+
+def enabled() -> bool:
+    return _state["enabled"]
+
+
+@contextmanager
+def _record(name, args):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (start - _t0) / 1000, "dur": (end - start) / 1000}
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        with _lock:
+            _events.append(event)
+
+
+class _Noop:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+def span(name, **args):
+    """Context manager timing the enclosed block under `name`."""
+    if not _state["enabled"]:
+        return _NOOP
+    return _record(name, args)
+
+
+def timed(name=None):
+    """Decorator form of span(); defaults to the function's name."""
+    def deco(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            with span(label):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+
+def count(name, n=1):
+    if _state["enabled"]:
+        with _lock:
+            _counters[name] += n
+
+
+def _percentile(sorted_xs, q):
+    if not sorted_xs:
+        return 0.0
+    k = (len(sorted_xs) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_xs[lo] + (sorted_xs[hi] - sorted_xs[lo]) * (k - lo)
+
+
+def summary() -> dict:
+    """Per-span stats in milliseconds plus counters."""
+    by_name = defaultdict(list)
+    with _lock:
+        for e in _events:
+            by_name[e["name"]].append(e["dur"] / 1000)
+        counters = dict(_counters)
+
+    spans = {}
+    for name, ms in sorted(by_name.items()):
+        ms.sort()
+        hist = defaultdict(int)
+        for x in ms:
+            # bucket upper bounds 1, 2, 4, 8 … ms
+            hist[f"<={2 ** max(0, math.ceil(math.log2(x))) if x > 0 else 1}ms"] += 1
+        spans[name] = {
+            "count": len(ms),
+            "total_ms": round(sum(ms), 3),
+            "p50_ms": round(_percentile(ms, 50), 3),
+            "p95_ms": round(_percentile(ms, 95), 3),
+            "max_ms": round(ms[-1], 3),
+            "histogram": dict(sorted(hist.items(), key=lambda kv: int(kv[0][2:-2]))),
+        }
+    return {"spans": spans, "counters": counters}
+
+
+def dump():
+    if not _state["enabled"]:
+        return
+    path = _state["path"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        events = list(_events)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh)
+    with open(path.with_suffix(".summary.json"), "w", encoding="utf-8") as fh:
+        json.dump(summary(), fh, indent=2)
+    if _state["profiler"] is not None:
+        _state["profiler"].disable()
+        _state["profiler"].dump_stats(str(path.with_suffix(".prof")))
+    print(f"📈 trace written to {path}")
+
+
+def enable_from_env():
+    if os.environ.get("TRACE_FILE"):
+        enable(os.environ["TRACE_FILE"], profile=os.environ.get("TRACE_PROFILE") == "1")
+
+
+enable_from_env()